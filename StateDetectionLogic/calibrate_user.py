@@ -4,20 +4,34 @@ Run this for 1-2 minutes while user is in normal studying posture
 to learn their baseline behavior and adapt thresholds
 """
 
-import cv2
-import mediapipe as mp
-import numpy as np
 import time
 import sys
+import queue
+import threading
 from pathlib import Path
 
 # Add parent directory to path
 sys.path.insert(0, str(Path(__file__).parent))
 
-from driver_state_detection.eye_detector import EyeDetector
-from driver_state_detection.pose_estimation import HeadPoseEstimator
-from driver_state_detection.adaptive_scorer import AdaptiveAttentionScorer
-from driver_state_detection.utils import get_landmarks
+# FaceMesh is skipped while the picture stays still: a frame whose grayscale
+# thumbnail differs from the last inferred one by less than STILL_FRAME_DELTA
+# (mean absolute pixel difference) reuses the previous landmarks. Every
+# MESH_REUSE_FRAMES-th frame still runs FaceMesh and adds a sample, so a
+# still user (the baseline posture) keeps contributing to the calibration.
+STILL_THUMB_SIZE = (64, 36)
+STILL_FRAME_DELTA = 2.0
+MESH_REUSE_FRAMES = 5
+
+
+def _put_until_stopped(q: queue.Queue, item, stop: threading.Event) -> bool:
+    """Put item on a bounded queue, waiting for space unless stop gets set."""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
 
 
 def calibrate_user(user_id: str = "default", duration_seconds: int = 120):
@@ -31,6 +45,16 @@ def calibrate_user(user_id: str = "default", duration_seconds: int = 120):
     duration_seconds : int
         Calibration duration (default 120 seconds = 2 minutes)
     """
+    # Heavy imports are deferred to here so `--help` and argument errors return instantly
+    import cv2
+    import mediapipe as mp
+    import numpy as np
+
+    from driver_state_detection.eye_detector import EyeDetector
+    from driver_state_detection.pose_estimation import HeadPoseEstimator
+    from driver_state_detection.adaptive_scorer import AdaptiveAttentionScorer
+    from driver_state_detection.utils import MESH_MAX_WIDTH, configure_capture, get_landmarks, limit_width, open_capture
+    
     print("=" * 60)
     print("STUDY FOCUS TRACKER - USER CALIBRATION")
     print("=" * 60)
@@ -45,6 +69,13 @@ def calibrate_user(user_id: str = "default", duration_seconds: int = 120):
     print("\nPress ENTER to start calibration...")
     input()
     
+    # OpenCV optimization (SIMD code paths for flip/cvtColor/resize)
+    if not cv2.useOptimized():
+        try:
+            cv2.setUseOptimized(True)
+        except Exception as e:
+            print(f"OpenCV optimization could not be set: {e}")
+    
     # Initialize components
     detector = mp.solutions.face_mesh.FaceMesh(
         static_image_mode=False,
@@ -57,102 +88,217 @@ def calibrate_user(user_id: str = "default", duration_seconds: int = 120):
     head_pose = HeadPoseEstimator(show_axis=True)
     adaptive_scorer = AdaptiveAttentionScorer(user_id=user_id)
     
-    # Open camera
-    cap = cv2.VideoCapture(0)
+    # Open camera with the same backend and capture geometry as the detection
+    # scripts' defaults, so the baseline is learned from the images they see
+    cap = open_capture(0, "auto")
     if not cap.isOpened():
         print("ERROR: Cannot open camera")
         return False
+    configure_capture(cap, "640x480")
     
     start_time = time.time()
     sample_count = 0
     
-    print("\nCalibration in progress...")
-    print("Look at the camera window to see your pose.")
+    # Three-stage pipeline: a reader thread grabs frames, a processing thread runs
+    # FaceMesh and the scorer, and this (main) thread shows the annotated frames.
+    # The bounded queues apply back-pressure so no stage runs ahead of the others.
+    # The HighGUI window stays on the main thread, which some platforms require.
+    read_q = queue.Queue(maxsize=2)
+    disp_q = queue.Queue(maxsize=2)
+    stop = threading.Event()
+    # Exception that ended the processing thread, re-raised on this thread
+    process_error = None
     
-    while True:
-        elapsed = time.time() - start_time
-        
-        if elapsed >= duration_seconds:
-            break
-        
-        ret, frame = cap.read()
-        if not ret:
-            print("ERROR: Cannot read frame")
-            break
+    def read_frames():
+        while not stop.is_set():
+            ret, frame = cap.read()
+            if not ret:
+                print("ERROR: Cannot read frame")
+                break
+            _put_until_stopped(read_q, frame, stop)
+    
+    def process_frames():
+        nonlocal process_error
+        try:
+            run_processing()
+        except BaseException as e:
+            process_error = e
+        finally:
+            # Calibration time is over, the camera stopped or processing
+            # failed: release the reader and the display loop
+            stop.set()
+    
+    def run_processing():
+        # Only the processing thread touches the FaceMesh model and adaptive_scorer
+        nonlocal sample_count
         
-        # Flip frame
-        frame = cv2.flip(frame, 2)
+        # Per-resolution state, recomputed only if the camera changes frame size:
+        # frame size, status overlay rows and the reused RGB buffer for MediaPipe
+        # (passed as a read-only view so MediaPipe skips its input copy)
+        frame_shape = None
+        rgb_buf = None
+        rgb_view = None
         
-        # Convert to grayscale
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        frame_size = frame.shape[1], frame.shape[0]
-        gray = np.expand_dims(gray, axis=2)
-        gray = np.concatenate([gray, gray, gray], axis=2)
+        # Status overlay strings, re-formatted only when their value changes
+        shown_progress = None
+        shown_samples = None
         
-        # Detect face
-        lms = detector.process(gray).multi_face_landmarks
+        # Last FaceMesh inference: its thumbnail and resulting landmarks, and
+        # the number of frames that have reused them since
+        mesh_thumb = None
+        reused_frames = 0
+        landmarks = None
+        still_delta_l1 = STILL_FRAME_DELTA * STILL_THUMB_SIZE[0] * STILL_THUMB_SIZE[1]
         
-        if lms:
-            landmarks = get_landmarks(lms)
+        while not stop.is_set():
+            now = time.time()
+            elapsed = now - start_time
             
-            # Get metrics
-            ear = eye_det.get_EAR(landmarks=landmarks)
-            gaze = eye_det.get_Gaze_Score(
-                frame=gray, landmarks=landmarks, frame_size=frame_size
-            )
-            frame_det, roll, pitch, yaw = head_pose.get_pose(
-                frame=frame, landmarks=landmarks, frame_size=frame_size
+            if elapsed >= duration_seconds:
+                break
+            
+            try:
+                frame = read_q.get(timeout=0.1)
+            except queue.Empty:
+                if not reader.is_alive():
+                    break
+                continue
+            
+            # Flip frame
+            frame = cv2.flip(frame, 2)
+            
+            if frame.shape != frame_shape:
+                frame_shape = frame.shape
+                frame_size = frame_shape[1], frame_shape[0]
+                samples_org = (10, frame_size[1] - 100)
+                progress_org = (10, frame_size[1] - 60)
+                remaining_org = (10, frame_size[1] - 20)
+                rgb_buf = None
+                mesh_thumb = None
+            
+            # The gaze detector only needs a single-channel view of the full frame
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            
+            # Reused landmarks only refresh the overlay: they add no calibration
+            # sample, so a still user doesn't skew the baseline with duplicates
+            thumb = cv2.resize(gray, STILL_THUMB_SIZE, interpolation=cv2.INTER_AREA)
+            fresh = not (
+                mesh_thumb is not None
+                and reused_frames < MESH_REUSE_FRAMES - 1
+                and cv2.norm(thumb, mesh_thumb, cv2.NORM_L1) < still_delta_l1
             )
+            reused_frames = 0 if fresh else reused_frames + 1
             
-            if frame_det is not None:
-                frame = frame_det
+            if fresh:
+                # MediaPipe expects RGB (of a downscaled copy)
+                small = limit_width(frame, MESH_MAX_WIDTH)
+                if rgb_buf is None:
+                    rgb_buf = np.empty_like(small)
+                    rgb_view = rgb_buf.view()
+                    rgb_view.flags.writeable = False
+                cv2.cvtColor(small, cv2.COLOR_BGR2RGB, dst=rgb_buf)
+                
+                # Detect face
+                lms = detector.process(rgb_view).multi_face_landmarks
+                landmarks = get_landmarks(lms) if lms else None
+                mesh_thumb = thumb
             
-            # Add calibration sample
-            if ear is not None and gaze is not None:
-                adaptive_scorer.add_calibration_sample(
-                    ear=ear,
-                    gaze=gaze,
-                    pitch=pitch[0] if pitch is not None else None,
-                    yaw=yaw[0] if yaw is not None else None,
-                    roll=roll[0] if roll is not None else None
+            if landmarks is not None:
+                # Get metrics
+                ear = eye_det.get_EAR(landmarks=landmarks)
+                gaze = eye_det.get_Gaze_Score(
+                    frame=gray, landmarks=landmarks, frame_size=frame_size
+                )
+                frame_det, roll, pitch, yaw = head_pose.get_pose(
+                    frame=frame, landmarks=landmarks, frame_size=frame_size
                 )
-                sample_count += 1
+                
+                if frame_det is not None:
+                    frame = frame_det
+                
+                # Add calibration sample
+                if fresh and ear is not None and gaze is not None:
+                    adaptive_scorer.add_calibration_sample(
+                        ear=ear,
+                        gaze=gaze,
+                        pitch=pitch[0] if pitch is not None else None,
+                        yaw=yaw[0] if yaw is not None else None,
+                        roll=roll[0] if roll is not None else None
+                    )
+                    sample_count += 1
+                
+                # Display current metrics
+                if ear is not None:
+                    cv2.putText(frame, f"EAR: {ear:.3f}", (10, 50),
+                               cv2.FONT_HERSHEY_PLAIN, 2, (255, 255, 255), 2)
+                if gaze is not None:
+                    cv2.putText(frame, f"Gaze: {gaze:.3f}", (10, 90),
+                               cv2.FONT_HERSHEY_PLAIN, 2, (255, 255, 255), 2)
+                if pitch is not None:
+                    cv2.putText(frame, f"Pitch: {pitch.round(1)[0]}", (10, 130),
+                               cv2.FONT_HERSHEY_PLAIN, 2, (255, 255, 255), 2)
             
-            # Display current metrics
-            if ear is not None:
-                cv2.putText(frame, f"EAR: {ear:.3f}", (10, 50),
-                           cv2.FONT_HERSHEY_PLAIN, 2, (255, 255, 255), 2)
-            if gaze is not None:
-                cv2.putText(frame, f"Gaze: {gaze:.3f}", (10, 90),
-                           cv2.FONT_HERSHEY_PLAIN, 2, (255, 255, 255), 2)
-            if pitch is not None:
-                cv2.putText(frame, f"Pitch: {pitch.round(1)[0]}", (10, 130),
-                           cv2.FONT_HERSHEY_PLAIN, 2, (255, 255, 255), 2)
-        
-        # Display progress
-        remaining = duration_seconds - int(elapsed)
-        progress = int((elapsed / duration_seconds) * 100)
-        cv2.putText(frame, f"Calibrating... {progress}%", (10, frame_size[1] - 60),
-                   cv2.FONT_HERSHEY_PLAIN, 2, (0, 255, 0), 2)
-        cv2.putText(frame, f"Time remaining: {remaining}s", (10, frame_size[1] - 20),
-                   cv2.FONT_HERSHEY_PLAIN, 2, (0, 255, 0), 2)
-        cv2.putText(frame, f"Samples: {sample_count}", (10, frame_size[1] - 100),
-                   cv2.FONT_HERSHEY_PLAIN, 1.5, (255, 255, 0), 2)
+            # Display progress
+            remaining = duration_seconds - int(elapsed)
+            progress = int((elapsed / duration_seconds) * 100)
+            if (progress, remaining) != shown_progress:
+                shown_progress = (progress, remaining)
+                progress_text = f"Calibrating... {progress}%"
+                remaining_text = f"Time remaining: {remaining}s"
+            if sample_count != shown_samples:
+                shown_samples = sample_count
+                samples_text = f"Samples: {sample_count}"
+            cv2.putText(frame, progress_text, progress_org,
+                       cv2.FONT_HERSHEY_PLAIN, 2, (0, 255, 0), 2)
+            cv2.putText(frame, remaining_text, remaining_org,
+                       cv2.FONT_HERSHEY_PLAIN, 2, (0, 255, 0), 2)
+            cv2.putText(frame, samples_text, samples_org,
+                       cv2.FONT_HERSHEY_PLAIN, 1.5, (255, 255, 0), 2)
+            
+            _put_until_stopped(disp_q, frame, stop)
+    
+    reader = threading.Thread(target=read_frames, name="calib-reader", daemon=True)
+    processor = threading.Thread(target=process_frames, name="calib-processor", daemon=True)
+    
+    print("\nCalibration in progress...")
+    print("Look at the camera window to see your pose.")
+    
+    reader.start()
+    processor.start()
+    
+    cancelled = False
+    while True:
+        try:
+            frame = disp_q.get(timeout=0.1)
+        except queue.Empty:
+            if not processor.is_alive():
+                break
+            continue
         
         # Show frame
         cv2.imshow("Calibration - Stay in normal study position", frame)
         
         # Allow early exit
         if cv2.waitKey(1) & 0xFF == ord('q'):
-            print("\nCalibration cancelled by user")
-            cap.release()
-            cv2.destroyAllWindows()
-            return False
+            cancelled = True
+            break
+    
+    stop.set()
+    processor.join()
+    reader.join()
     
     # Cleanup
     cap.release()
     cv2.destroyAllWindows()
     
+    # A failed run must not be finalized from its partial samples
+    if process_error is not None:
+        raise process_error
+    
+    if cancelled:
+        print("\nCalibration cancelled by user")
+        return False
+    
     # Finalize calibration
     print(f"\n\nCalibration complete! Collected {sample_count} samples.")
     print("Computing personalized thresholds...")
@@ -4,9 +4,26 @@ Learns user's baseline behavior and adapts thresholds accordingly
 """
 
 import numpy as np
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Tuple
 import json
-from pathlib import Path
+import os
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+# Initial per-metric capacity of the calibration buffers (~2 minutes at 30fps).
+# Buffers double in size if a longer calibration run fills them.
+CALIBRATION_CAPACITY = 4096
+
+# Row of each metric in the calibration sample block
+CAL_EAR, CAL_GAZE, CAL_PITCH, CAL_YAW, CAL_ROLL = range(5)
+
+# Number of recent samples used by the anomaly (spoofing) variance check
+ANOMALY_WINDOW = 30
 
 
 class AdaptiveAttentionScorer:
@@ -15,6 +32,12 @@ class AdaptiveAttentionScorer:
     Learns baseline metrics during calibration and adjusts thresholds.
     """
     
+    # Parsed calibration files shared by every instance in the process,
+    # keyed by absolute file path, so repeated instantiation skips parsing.
+    # Each entry keeps the file's st_mtime_ns and is reloaded once the file
+    # changes (e.g. rewritten by another calibration run).
+    _calibration_cache: Dict[str, Tuple[int, dict]] = {}
+    
     def __init__(
         self,
         user_id: Optional[str] = None,
@@ -39,21 +62,28 @@ class AdaptiveAttentionScorer:
         self.roll_thresh = 60
         self.pitch_thresh = 20
         self.yaw_thresh = 30
+        self._sync_thresholds()
         
-        # Calibration data
+        # Calibration data: one preallocated (metric, sample) float32 block with a
+        # row per CAL_* metric, a write index per row, and running sums per row so
+        # mean/std are available without another pass
         self.is_calibrated = False
-        self.calibration_data = {
-            'ear_baseline': [],
-            'gaze_baseline': [],
-            'pitch_baseline': [],
-            'yaw_baseline': [],
-            'roll_baseline': [],
-        }
+        self.calibration_data = np.empty((5, CALIBRATION_CAPACITY), dtype=np.float32)
+        self.calibration_counts = [0] * 5
+        self.calibration_sums = [0.0] * 5
+        self.calibration_sums2 = [0.0] * 5
         
-        # Metrics history for pattern analysis
-        self.ear_history = []
-        self.gaze_history = []
-        self.pitch_history = []
+        # Metrics history for pattern analysis: fixed-size ring buffers holding
+        # the last ANOMALY_WINDOW samples, with a write cursor and fill count each.
+        # Running sum / sum of squares over the window make the variance O(1).
+        self.history = {
+            key: [0.0] * ANOMALY_WINDOW
+            for key in ('ear', 'gaze', 'pitch')
+        }
+        self.history_pos = {key: 0 for key in self.history}
+        self.history_len = {key: 0 for key in self.history}
+        self.history_sum = {key: 0.0 for key in self.history}
+        self.history_sum2 = {key: 0.0 for key in self.history}
         
         # Load existing calibration if available
         self._load_calibration()
@@ -71,15 +101,47 @@ class AdaptiveAttentionScorer:
         User should be in normal studying posture.
         """
         if ear is not None:
-            self.calibration_data['ear_baseline'].append(ear)
+            self._append_calibration_value(CAL_EAR, ear)
         if gaze is not None:
-            self.calibration_data['gaze_baseline'].append(gaze)
+            self._append_calibration_value(CAL_GAZE, gaze)
         if pitch is not None:
-            self.calibration_data['pitch_baseline'].append(pitch)
+            self._append_calibration_value(CAL_PITCH, pitch)
         if yaw is not None:
-            self.calibration_data['yaw_baseline'].append(yaw)
+            self._append_calibration_value(CAL_YAW, yaw)
         if roll is not None:
-            self.calibration_data['roll_baseline'].append(roll)
+            self._append_calibration_value(CAL_ROLL, roll)
+    
+    def _append_calibration_value(self, row: int, value: float):
+        """Write one sample into its metric row and update the running sums."""
+        idx = self.calibration_counts[row]
+        if idx == self.calibration_data.shape[1]:
+            self.calibration_data = np.concatenate(
+                (self.calibration_data, np.empty_like(self.calibration_data)), axis=1
+            )
+        value = float(value)
+        self.calibration_data[row, idx] = value
+        self.calibration_counts[row] = idx + 1
+        self.calibration_sums[row] += value
+        self.calibration_sums2[row] += value * value
+    
+    def _calibration_percentile(self, row: int, q: float) -> float:
+        """
+        Percentile of the collected samples (same linear interpolation as
+        np.percentile) using a partial partition instead of a full sort.
+        """
+        n = self.calibration_counts[row]
+        pos = (n - 1) * q / 100.0
+        lo = int(pos)
+        hi = min(lo + 1, n - 1)
+        part = np.partition(self.calibration_data[row, :n], (lo, hi))
+        return float(part[lo]) + float(part[hi] - part[lo]) * (pos - lo)
+    
+    def _calibration_mean_std(self, row: int) -> Tuple[float, float]:
+        """Mean and (population) std from the running sums."""
+        n = self.calibration_counts[row]
+        mean = self.calibration_sums[row] / n
+        var = max(self.calibration_sums2[row] / n - mean * mean, 0.0)
+        return mean, var ** 0.5
     
     def finalize_calibration(self, min_samples: int = 50):
         """
@@ -90,46 +152,40 @@ class AdaptiveAttentionScorer:
         min_samples : int
             Minimum samples required for calibration
         """
-        if len(self.calibration_data['ear_baseline']) < min_samples:
-            print(f"Warning: Insufficient calibration samples ({len(self.calibration_data['ear_baseline'])} < {min_samples})")
+        ear_count = self.calibration_counts[CAL_EAR]
+        if ear_count < min_samples:
+            print(f"Warning: Insufficient calibration samples ({ear_count} < {min_samples})")
             return False
         
         # EAR threshold: 25th percentile (lower = eyes more closed)
-        if self.calibration_data['ear_baseline']:
-            ear_baseline = np.array(self.calibration_data['ear_baseline'])
-            self.ear_thresh = np.percentile(ear_baseline, 25) * 0.9
+        if self.calibration_counts[CAL_EAR]:
+            self.ear_thresh = self._calibration_percentile(CAL_EAR, 25) * 0.9
             print(f"Calibrated EAR threshold: {self.ear_thresh:.3f}")
         
         # Gaze threshold: 75th percentile (higher = more off-center)
-        if self.calibration_data['gaze_baseline']:
-            gaze_baseline = np.array(self.calibration_data['gaze_baseline'])
-            self.gaze_thresh = np.percentile(gaze_baseline, 75) * 1.2
+        if self.calibration_counts[CAL_GAZE]:
+            self.gaze_thresh = self._calibration_percentile(CAL_GAZE, 75) * 1.2
             print(f"Calibrated Gaze threshold: {self.gaze_thresh:.3f}")
         
         # Pitch threshold: mean ± 1.5 std
-        if self.calibration_data['pitch_baseline']:
-            pitch_baseline = np.array(self.calibration_data['pitch_baseline'])
-            pitch_mean = np.mean(pitch_baseline)
-            pitch_std = np.std(pitch_baseline)
+        if self.calibration_counts[CAL_PITCH]:
+            pitch_mean, pitch_std = self._calibration_mean_std(CAL_PITCH)
             self.pitch_thresh = abs(pitch_mean) + 1.5 * pitch_std
             print(f"Calibrated Pitch threshold: ±{self.pitch_thresh:.1f}°")
         
         # Yaw threshold: mean ± 1.5 std
-        if self.calibration_data['yaw_baseline']:
-            yaw_baseline = np.array(self.calibration_data['yaw_baseline'])
-            yaw_mean = np.mean(yaw_baseline)
-            yaw_std = np.std(yaw_baseline)
+        if self.calibration_counts[CAL_YAW]:
+            yaw_mean, yaw_std = self._calibration_mean_std(CAL_YAW)
             self.yaw_thresh = abs(yaw_mean) + 1.5 * yaw_std
             print(f"Calibrated Yaw threshold: ±{self.yaw_thresh:.1f}°")
         
         # Roll threshold: mean ± 2 std (more tolerance)
-        if self.calibration_data['roll_baseline']:
-            roll_baseline = np.array(self.calibration_data['roll_baseline'])
-            roll_mean = np.mean(roll_baseline)
-            roll_std = np.std(roll_baseline)
+        if self.calibration_counts[CAL_ROLL]:
+            roll_mean, roll_std = self._calibration_mean_std(CAL_ROLL)
             self.roll_thresh = abs(roll_mean) + 2.0 * roll_std
             print(f"Calibrated Roll threshold: ±{self.roll_thresh:.1f}°")
         
+        self._sync_thresholds()
         self.is_calibrated = True
         self._save_calibration()
         return True
@@ -150,26 +206,20 @@ class AdaptiveAttentionScorer:
         """
         # Add to history
         if ear is not None:
-            self.ear_history.append(ear)
+            self._push_history('ear', ear)
         if gaze is not None:
-            self.gaze_history.append(gaze)
+            self._push_history('gaze', gaze)
         if pitch is not None:
-            self.pitch_history.append(pitch)
-        
-        # Keep only recent history
-        max_history = 100
-        self.ear_history = self.ear_history[-max_history:]
-        self.gaze_history = self.gaze_history[-max_history:]
-        self.pitch_history = self.pitch_history[-max_history:]
+            self._push_history('pitch', pitch)
         
         # Need sufficient history
-        if len(self.ear_history) < 30:
+        if self.history_len['ear'] < ANOMALY_WINDOW:
             return False
         
         # Calculate variance
-        ear_var = np.var(self.ear_history[-30:]) if self.ear_history else 1.0
-        gaze_var = np.var(self.gaze_history[-30:]) if self.gaze_history else 1.0
-        pitch_var = np.var(self.pitch_history[-30:]) if self.pitch_history else 1.0
+        ear_var = self._history_var('ear')
+        gaze_var = self._history_var('gaze')
+        pitch_var = self._history_var('pitch')
         
         # Real humans have variance; too low = suspicious
         EAR_MIN_VARIANCE = 0.0001
@@ -187,9 +237,36 @@ class AdaptiveAttentionScorer:
         
         return suspicious
     
-    def get_thresholds(self) -> Dict[str, float]:
-        """Get current threshold values."""
-        return {
+    def _push_history(self, key: str, value: float):
+        """Overwrite the oldest slot of a metric's ring buffer and update its sums."""
+        ring = self.history[key]
+        pos = self.history_pos[key]
+        value = float(value)
+        old = ring[pos]
+        ring[pos] = value
+        self.history_pos[key] = (pos + 1) % ANOMALY_WINDOW
+        if self.history_len[key] < ANOMALY_WINDOW:
+            self.history_len[key] += 1
+        
+        if self.history_pos[key] == 0:
+            # Resync once per wrap so floating point drift cannot accumulate
+            self.history_sum[key] = sum(ring)
+            self.history_sum2[key] = sum(v * v for v in ring)
+        else:
+            self.history_sum[key] += value - old
+            self.history_sum2[key] += value * value - old * old
+    
+    def _history_var(self, key: str) -> float:
+        """Population variance of the buffered samples from the running sums."""
+        n = self.history_len[key]
+        if n == 0:
+            return 1.0
+        mean = self.history_sum[key] / n
+        return max(self.history_sum2[key] / n - mean * mean, 0.0)
+    
+    def _sync_thresholds(self):
+        """Rebuild the memoized threshold dict; call after changing any *_thresh."""
+        self._thresholds = {
             'ear_thresh': self.ear_thresh,
             'gaze_thresh': self.gaze_thresh,
             'roll_thresh': self.roll_thresh,
@@ -197,6 +274,10 @@ class AdaptiveAttentionScorer:
             'yaw_thresh': self.yaw_thresh,
         }
     
+    def get_thresholds(self) -> Dict[str, float]:
+        """Get current threshold values."""
+        return self._thresholds.copy()
+    
     def _save_calibration(self):
         """Save calibration data to file."""
         try:
@@ -205,37 +286,67 @@ class AdaptiveAttentionScorer:
                 'is_calibrated': self.is_calibrated,
                 'thresholds': self.get_thresholds(),
                 'calibration_stats': {
-                    'ear_samples': len(self.calibration_data['ear_baseline']),
-                    'gaze_samples': len(self.calibration_data['gaze_baseline']),
-                    'pitch_samples': len(self.calibration_data['pitch_baseline']),
+                    'ear_samples': self.calibration_counts[CAL_EAR],
+                    'gaze_samples': self.calibration_counts[CAL_GAZE],
+                    'pitch_samples': self.calibration_counts[CAL_PITCH],
                 }
             }
             
-            with open(self.calibration_file, 'w') as f:
-                json.dump(data, f, indent=2)
+            if ORJSON_AVAILABLE:
+                payload = orjson.dumps(
+                    data, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY
+                )
+            else:
+                payload = json.dumps(data, indent=2).encode('utf-8')
+            
+            # Write the whole file in one call to a temp file and swap it in, so a
+            # crash mid-write can never leave a truncated calibration behind
+            tmp_file = f"{self.calibration_file}.tmp"
+            try:
+                with open(tmp_file, 'wb') as f:
+                    f.write(payload)
+                os.replace(tmp_file, self.calibration_file)
+            except BaseException:
+                if os.path.exists(tmp_file):
+                    os.remove(tmp_file)
+                raise
+            self._calibration_cache[os.path.abspath(self.calibration_file)] = (
+                os.stat(self.calibration_file).st_mtime_ns, data
+            )
             
             print(f"Calibration saved to {self.calibration_file}")
         except Exception as e:
             print(f"Failed to save calibration: {e}")
     
     def _load_calibration(self):
-        """Load calibration data from file."""
+        """Load calibration data from file (or the in-process cache)."""
+        cache_key = os.path.abspath(self.calibration_file)
         try:
-            if Path(self.calibration_file).exists():
+            try:
+                mtime_ns = os.stat(self.calibration_file).st_mtime_ns
+            except FileNotFoundError:
+                self._calibration_cache.pop(cache_key, None)
+                return False
+            cached = self._calibration_cache.get(cache_key)
+            if cached is not None and cached[0] == mtime_ns:
+                data = cached[1]
+            else:
                 with open(self.calibration_file, 'r') as f:
                     data = json.load(f)
+                self._calibration_cache[cache_key] = (mtime_ns, data)
+            
+            if data.get('user_id') == self.user_id:
+                thresholds = data.get('thresholds', {})
+                self.ear_thresh = thresholds.get('ear_thresh', self.ear_thresh)
+                self.gaze_thresh = thresholds.get('gaze_thresh', self.gaze_thresh)
+                self.roll_thresh = thresholds.get('roll_thresh', self.roll_thresh)
+                self.pitch_thresh = thresholds.get('pitch_thresh', self.pitch_thresh)
+                self.yaw_thresh = thresholds.get('yaw_thresh', self.yaw_thresh)
+                self._sync_thresholds()
+                self.is_calibrated = data.get('is_calibrated', False)
                 
-                if data.get('user_id') == self.user_id:
-                    thresholds = data.get('thresholds', {})
-                    self.ear_thresh = thresholds.get('ear_thresh', self.ear_thresh)
-                    self.gaze_thresh = thresholds.get('gaze_thresh', self.gaze_thresh)
-                    self.roll_thresh = thresholds.get('roll_thresh', self.roll_thresh)
-                    self.pitch_thresh = thresholds.get('pitch_thresh', self.pitch_thresh)
-                    self.yaw_thresh = thresholds.get('yaw_thresh', self.yaw_thresh)
-                    self.is_calibrated = data.get('is_calibrated', False)
-                    
-                    print(f"Calibration loaded from {self.calibration_file}")
-                    return True
+                print(f"Calibration loaded from {self.calibration_file}")
+                return True
         except Exception as e:
             print(f"Failed to load calibration: {e}")
         
@@ -4,8 +4,8 @@ Combines face detection, pose, gaze, and object detection to classify user activ
 """
 
 import numpy as np
-from typing import Dict, Optional, Tuple
-from collections import deque
+from typing import Dict, List, Optional, Tuple
+from collections import Counter
 
 
 class ActivityType:
@@ -22,6 +22,32 @@ class ActivityType:
     UNKNOWN = "unknown"
 
 
+# Productive activities are never treated as distractions
+PRODUCTIVE_ACTIVITIES = frozenset({
+    ActivityType.FOCUSED_STUDYING,
+    ActivityType.READING_BOOK,
+    ActivityType.TAKING_NOTES,
+    ActivityType.TYPING,
+})
+
+# Activities that count towards a sustained distraction
+DISTRACTED_ACTIVITIES = frozenset({
+    ActivityType.PHONE_DISTRACTION,
+    ActivityType.FACE_MISSING,
+    ActivityType.LOOKING_AWAY,
+})
+
+# Compact int8 code per activity, used by the activity history ring buffer
+ACTIVITY_NAMES = tuple(
+    value for name, value in vars(ActivityType).items() if not name.startswith('_')
+)
+ACTIVITY_CODES = {activity: code for code, activity in enumerate(ACTIVITY_NAMES)}
+DISTRACTED_CODE_MASK = np.array([a in DISTRACTED_ACTIVITIES for a in ACTIVITY_NAMES])
+
+# Frames of activity history kept (~1 second at 30fps)
+HISTORY_LENGTH = 30
+
+
 class ContextAnalyzer:
     """
     Analyzes context to determine user activity and distraction level.
@@ -39,11 +65,52 @@ class ContextAnalyzer:
         self.MICRO_BREAK_THRESHOLD = 5.0           # Ignore brief glances (seconds)
         self.SUSTAINED_ACTIVITY_THRESHOLD = 3.0    # Confirm activity after 3s
         
-        # Activity history for pattern recognition
-        self.activity_history = deque(maxlen=30)   # Last 30 frames (~1 second at 30fps)
+        # Activity history for pattern recognition: int8 ring buffer of activity
+        # codes with a write cursor and fill count, plus per-activity counts over
+        # the buffered frames, all kept in step by _push_activity
+        self.history_codes = np.full(HISTORY_LENGTH, -1, dtype=np.int8)
+        self.history_pos = 0
+        self.history_len = 0
+        self.activity_counts = Counter()
+        self.distracted_count = 0
         self.distraction_start_time = None
         self.current_activity = ActivityType.UNKNOWN
         
+    def reset(self):
+        """Clear all temporal state so the analyzer can be reused for a new stream."""
+        self.history_codes.fill(-1)
+        self.history_pos = 0
+        self.history_len = 0
+        self.activity_counts.clear()
+        self.distracted_count = 0
+        self.distraction_start_time = None
+        self.current_activity = ActivityType.UNKNOWN
+    
+    def _push_activity(self, activity: str):
+        """Append to the history, updating the counts for the evicted and new entry."""
+        pos = self.history_pos
+        if self.history_len == HISTORY_LENGTH:
+            oldest = ACTIVITY_NAMES[self.history_codes[pos]]
+            self.activity_counts[oldest] -= 1
+            if oldest in DISTRACTED_ACTIVITIES:
+                self.distracted_count -= 1
+        else:
+            self.history_len += 1
+        self.history_codes[pos] = ACTIVITY_CODES[activity]
+        self.history_pos = (pos + 1) % HISTORY_LENGTH
+        self.activity_counts[activity] += 1
+        if activity in DISTRACTED_ACTIVITIES:
+            self.distracted_count += 1
+    
+    def _recent_codes(self, n: int) -> np.ndarray:
+        """Codes of the last n pushed activities, oldest first."""
+        return self.history_codes[(self.history_pos - n + np.arange(n)) % HISTORY_LENGTH]
+    
+    @property
+    def activity_history(self) -> List[str]:
+        """Buffered activities, oldest first."""
+        return [ACTIVITY_NAMES[code] for code in self._recent_codes(self.history_len)]
+    
     def analyze_context(
         self,
         t_now: float,
@@ -90,7 +157,7 @@ class ContextAnalyzer:
             activity = ActivityType.FACE_MISSING
             is_distracted = True
             severity = 0.8
-            self.activity_history.append(activity)
+            self._push_activity(activity)
             return activity, is_distracted, severity
         
         # Extract object presence
@@ -112,7 +179,7 @@ class ContextAnalyzer:
         )
         
         # Update history
-        self.activity_history.append(activity)
+        self._push_activity(activity)
         self.current_activity = activity
         
         return activity, is_distracted, severity
@@ -186,20 +253,13 @@ class ContextAnalyzer:
         severity : float (0.0 to 1.0)
         """
         # Productive activities are not distractions
-        productive_activities = {
-            ActivityType.FOCUSED_STUDYING,
-            ActivityType.READING_BOOK,
-            ActivityType.TAKING_NOTES,
-            ActivityType.TYPING,
-        }
-        
-        if activity in productive_activities:
+        if activity in PRODUCTIVE_ACTIVITIES:
             return False, 0.0
         
         # Drinking water is a brief, acceptable break
         if activity == ActivityType.DRINKING_WATER:
             # Check if drinking for too long (> 10 seconds is suspicious)
-            recent_drinking = sum(1 for a in self.activity_history if a == ActivityType.DRINKING_WATER)
+            recent_drinking = self.activity_counts[ActivityType.DRINKING_WATER]
             if recent_drinking < 15:  # Less than ~0.5 seconds at 30fps
                 return False, 0.0  # Not a distraction
             else:
@@ -208,7 +268,7 @@ class ContextAnalyzer:
         # Thinking is allowed briefly
         if activity == ActivityType.THINKING:
             # Check if thinking for too long
-            recent_thinking = sum(1 for a in self.activity_history if a == ActivityType.THINKING)
+            recent_thinking = self.activity_counts[ActivityType.THINKING]
             if recent_thinking < 8:  # Less than ~0.25 seconds
                 return False, 0.1
             else:
@@ -223,11 +283,8 @@ class ContextAnalyzer:
             return True, 0.8
         
         # Looking away is moderate distraction
-        # Count consecutive looking away frames to detect sustained distraction
+        # The main loop will handle the 15-second sustained check
         if activity == ActivityType.LOOKING_AWAY:
-            recent_looking_away = sum(1 for a in self.activity_history if a == ActivityType.LOOKING_AWAY)
-            # If looking away for more than 15 frames (~0.5s at 30fps), flag as distracted
-            # The main loop will handle the 15-second sustained check
             return True, 0.6
         
         # Unknown activity is low severity
@@ -242,17 +299,15 @@ class ContextAnalyzer:
         Dict[str, float]
             Percentage of time in each activity
         """
-        if not self.activity_history:
+        if not self.history_len:
             return {}
         
-        total = len(self.activity_history)
-        pattern = {}
-        
-        for activity in set(self.activity_history):
-            count = sum(1 for a in self.activity_history if a == activity)
-            pattern[activity] = count / total
-        
-        return pattern
+        total = self.history_len
+        return {
+            activity: count / total
+            for activity, count in self.activity_counts.items()
+            if count
+        }
     
     def is_sustained_distraction(self, threshold_seconds: float = 3.0, fps: float = 30.0) -> bool:
         """
@@ -272,19 +327,16 @@ class ContextAnalyzer:
         """
         required_frames = int(threshold_seconds * fps)
         
-        if len(self.activity_history) < required_frames:
+        if self.history_len < required_frames:
             return False
         
-        # Check last N frames
-        recent = list(self.activity_history)[-required_frames:]
-        
-        distracted_activities = {
-            ActivityType.PHONE_DISTRACTION,
-            ActivityType.FACE_MISSING,
-            ActivityType.LOOKING_AWAY,
-        }
-        
-        distracted_count = sum(1 for a in recent if a in distracted_activities)
+        if required_frames == self.history_len:
+            # Window covers the whole history: the running count is exact
+            distracted_count = self.distracted_count
+        else:
+            # Check last N frames
+            recent = self._recent_codes(required_frames)
+            distracted_count = int(np.count_nonzero(DISTRACTED_CODE_MASK[recent]))
         
         # Consider sustained if >80% of frames are distracted
         return distracted_count / required_frames > 0.8
@@ -4,10 +4,13 @@ Integrates object detection, context analysis, adaptive thresholds, and pattern
 """
 
 import os
+import queue
+import signal
 import socket
+import sys
+import threading
 import time
 import pprint
-import requests
 import cv2
 import mediapipe as mp
 import numpy as np
@@ -19,23 +22,42 @@ try:
     from .eye_detector import EyeDetector as EyeDet
     from .parser import get_args
     from .pose_estimation import HeadPoseEstimator as HeadPoseEst
-    from .utils import get_landmarks, load_camera_parameters
+    from .utils import MESH_MAX_WIDTH, configure_capture, get_landmarks, limit_width, load_camera_parameters, open_capture, put_latest
     from .object_detector import ObjectDetector
     from .context_analyzer import ContextAnalyzer, ActivityType
     from .adaptive_scorer import AdaptiveAttentionScorer
     from .pattern_recognizer import PatternRecognizer
     from .server_reporter import ServerReporter
+    from .http_notifier import HttpNotifier
 except ImportError:
     from attention_scorer import AttentionScorer as AttScorer
     from eye_detector import EyeDetector as EyeDet
     from parser import get_args
     from pose_estimation import HeadPoseEstimator as HeadPoseEst
-    from utils import get_landmarks, load_camera_parameters
+    from utils import MESH_MAX_WIDTH, configure_capture, get_landmarks, limit_width, load_camera_parameters, open_capture, put_latest
     from object_detector import ObjectDetector
     from context_analyzer import ContextAnalyzer, ActivityType
     from adaptive_scorer import AdaptiveAttentionScorer
     from pattern_recognizer import PatternRecognizer
     from server_reporter import ServerReporter
+    from http_notifier import HttpNotifier
+
+
+# Once the face has been missing this many frames in a row the user is away,
+# and YOLO drops to at most one run every AWAY_YOLO_INTERVAL frames
+AWAY_STREAK_FRAMES = 30
+AWAY_YOLO_INTERVAL = 15
+
+WINDOW_NAME = "Enhanced Study Focus Tracker - Press 'q' to quit"
+
+# Overlay text per activity, built once ("asleep" comes from the old scorer)
+ACTIVITY_LABELS = {
+    activity: f"Activity: {activity.replace('_', ' ').title()}"
+    for activity in [
+        value for name, value in vars(ActivityType).items()
+        if not name.startswith('_')
+    ] + ["asleep"]
+}
 
 
 def get_local_ip():
@@ -51,6 +73,9 @@ def get_local_ip():
 
 
 def main():
+    # Bound locally: the overlay code looks it up ~20 times per frame
+    FONT = cv2.FONT_HERSHEY_PLAIN
+    
     # Load environment variables
     env_path = Path(__file__).parent.parent / '.env'
     load_dotenv(dotenv_path=env_path)
@@ -73,6 +98,12 @@ def main():
         except Exception as e:
             print(f"OpenCV optimization could not be set: {e}")
     
+    # Cap the native thread pools: OpenCV and PyTorch would each spawn one
+    # thread per logical CPU and oversubscribe the cores next to FaceMesh and
+    # the capture/display/HTTP threads
+    native_threads = max(1, min(2, (os.cpu_count() or 2) // 2))
+    cv2.setNumThreads(native_threads)
+    
     # Load camera parameters
     if args.camera_params:
         camera_matrix, dist_coeffs = load_camera_parameters(args.camera_params)
@@ -108,7 +139,13 @@ def main():
     print("\nInitializing enhanced detection modules...")
     
     # Object detector (YOLOv8)
-    object_detector = ObjectDetector(model_size='n', confidence_threshold=0.5)
+    object_detector = ObjectDetector(
+        model_size='n', confidence_threshold=0.5, num_threads=native_threads,
+        weights=args.yolo_weights,
+        export_format=None if args.yolo_format == 'pt' else args.yolo_format,
+        int8_data=args.yolo_calib,
+        motion_threshold=args.yolo_motion_thresh or None
+    )
     if object_detector.enabled:
         print("✓ Object detection enabled (YOLOv8)")
     else:
@@ -137,8 +174,9 @@ def main():
     print("\n" + "=" * 50 + "\n")
     
     # Timing variables
+    tick_ms = 1000.0 / cv2.getTickFrequency()  # constant: getTickCount delta -> ms
     prev_time = time.perf_counter()
-    fps = 0.0
+    fps = 0  # rounded to an int once per frame, only used for display
     t_now = time.perf_counter()
     
     # Original attention scorer (for backward compatibility)
@@ -157,10 +195,21 @@ def main():
     )
     
     # Capture video
-    cap = cv2.VideoCapture(args.camera)
+    cap = open_capture(args.camera, args.capture_backend)
     if not cap.isOpened():
         print("Cannot open camera")
         exit()
+    # Smaller frames, and keep the driver from queueing stale frames behind
+    # the one we read
+    configure_capture(cap, args.capture_size)
+    
+    # Warm YOLO up at the camera's frame size so the first detection does not
+    # stall the stream while the model and kernels are set up
+    object_detector.warmup((
+        int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)) or 480,
+        int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)) or 640,
+        3,
+    ))
     
     # State tracking
     last_distracted = False
@@ -172,18 +221,88 @@ def main():
     current_activity = ActivityType.UNKNOWN
     distraction_start_time = None
     
+    # State-change notifications are sent from a background thread so a slow
+    # or unreachable server never stalls frame capture; session start/stop
+    # reuse its keep-alive connection
+    notifier = HttpNotifier(SERVER_URL)
+    
     # Notify server to start session
     try:
-        requests.post(f"{SERVER_URL}/session/start", json={}, timeout=0.5)
+        notifier.send("/session/start", {}, timeout=0.5)
         print(f"Connected to server at {SERVER_URL}")
     except Exception as e:
         print(f"Warning: Could not connect to server at {SERVER_URL}: {e}")
         print("Continuing in standalone mode...")
     
+    def notify_state(light_on, edge=None):
+        """One POST per state change: the light, plus the session edge if given."""
+        payload = {"light_on": light_on}
+        if edge is not None:
+            payload.update(edge)
+        notifier.post("/state", payload, timeout=0.75)
+    
     start_time = time.perf_counter()
     frame_count = 0
     
-    print("Detection started. Press 'q' to quit.\n")
+    # Objects come and go on a scale of seconds, so YOLO only runs every
+    # yolo_interval frames; the frames in between reuse the last result
+    yolo_interval = max(1, args.yolo_interval)
+    away_yolo_interval = max(yolo_interval, AWAY_YOLO_INTERVAL)
+    face_missing_streak = 0  # consecutive frames without a face
+    detected_objects = {}
+    object_labels = ()  # "+ Name" overlay text of the detected objects
+    
+    # Reused RGB buffer (reallocated on resize) and the read-only view of it
+    # handed to MediaPipe, which skips its defensive input copy for those
+    rgb_buf = None
+    rgb_view = None
+    
+    # Grabber thread: reads frames while the main thread runs inference. The
+    # 1-slot queue drops the older frame, so the loop always gets the newest
+    # one; None signals that the camera stopped delivering frames.
+    frame_q = queue.Queue(maxsize=1)
+    grab_stop = threading.Event()
+    mirror = args.camera == 0
+    
+    def grab_frames():
+        while not grab_stop.is_set():
+            ret, grabbed = cap.read()
+            # Flip frame if from webcam (in place: the frame is ours, no new buffer)
+            if ret and mirror:
+                cv2.flip(grabbed, 1, dst=grabbed)
+            put_latest(frame_q, grabbed if ret else None)
+            if not ret:
+                break
+    
+    grab_thread = threading.Thread(target=grab_frames, daemon=True)
+    grab_thread.start()
+    
+    # Display thread: imshow/waitKey run alongside the next frame's inference.
+    # macOS only allows HighGUI on the main thread, and the eye-processing
+    # windows are opened from the main thread, so those cases show inline.
+    # With --no-show nothing is displayed and Ctrl+C sets quit_event instead.
+    threaded_display = args.show and sys.platform != 'darwin' and not args.show_eye_proc
+    display_q = queue.Queue(maxsize=1)
+    quit_event = threading.Event()
+    if not args.show:
+        signal.signal(signal.SIGINT, lambda signum, frame: quit_event.set())
+    
+    def show_frames():
+        while True:
+            shown = display_q.get()
+            if shown is None:
+                break
+            cv2.imshow(WINDOW_NAME, shown)
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                quit_event.set()
+                break
+        cv2.destroyAllWindows()
+    
+    if threaded_display:
+        display_thread = threading.Thread(target=show_frames, daemon=True)
+        display_thread.start()
+    
+    print("Detection started. Press 'q' to quit.\n" if args.show else "Detection started (headless). Press Ctrl+C to quit.\n")
     
     while True:
         t_now = time.perf_counter()
@@ -191,31 +310,46 @@ def main():
         prev_time = t_now
         
         if elapsed_time > 0:
-            fps = np.round(1 / elapsed_time, 3)
+            fps = round(1.0 / elapsed_time)
         
-        ret, frame = cap.read()
-        if not ret:
+        frame = frame_q.get()
+        if frame is None:
             print("Can't receive frame from camera")
             break
         
-        # Flip frame if from webcam
-        if args.camera == 0:
-            frame = cv2.flip(frame, 2)
-        
         e1 = cv2.getTickCount()
         
-        # Convert to grayscale for MediaPipe
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
         frame_size = frame.shape[1], frame.shape[0]
-        gray = np.expand_dims(gray, axis=2)
-        gray = np.concatenate([gray, gray, gray], axis=2)
+        
+        # MediaPipe expects RGB (of a downscaled copy)
+        small = limit_width(frame, MESH_MAX_WIDTH)
+        if rgb_buf is None or rgb_buf.shape != small.shape:
+            rgb_buf = np.empty_like(small)
+            rgb_view = rgb_buf.view()
+            rgb_view.flags.writeable = False
+        cv2.cvtColor(small, cv2.COLOR_BGR2RGB, dst=rgb_buf)
+        
+        # NEW: Detect objects in frame (in parallel with face detection; frame
+        # must not be drawn on until the result has been collected)
+        interval = away_yolo_interval if face_missing_streak > AWAY_STREAK_FRAMES else yolo_interval
+        run_yolo = frame_count % interval == 0
+        if run_yolo:
+            # YOLO runs on the detector's worker thread while FaceMesh works on
+            # the main thread (both release the GIL inside their native backends).
+            # The result stands for `interval` frames, which the motion gate counts
+            objects_future = object_detector.submit(frame, interval)
         
         # Detect faces
-        lms = Detector.process(gray).multi_face_landmarks
+        lms = Detector.process(rgb_view).multi_face_landmarks
         face_detected = bool(lms)
+        face_missing_streak = 0 if face_detected else face_missing_streak + 1
         
-        # NEW: Detect objects in frame
-        detected_objects = object_detector.detect_objects(frame)
+        if run_yolo:
+            detected_objects = objects_future.result()
+            object_labels = tuple(
+                f"+ {obj_name.title()}"
+                for obj_name, detected in detected_objects.items() if detected
+            )
         
         # Update face presence timers
         if not face_detected:
@@ -243,6 +377,11 @@ def main():
             # Get landmarks
             landmarks = get_landmarks(lms)
             
+            # Single-channel view of the full frame for the gaze detector,
+            # taken before anything is drawn on frame (face-missing frames
+            # skip the conversion)
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            
             # Show eye keypoints
             Eye_det.show_eye_keypoints(
                 color_frame=frame, landmarks=landmarks, frame_size=frame_size
@@ -267,15 +406,21 @@ def main():
             if frame_det is not None:
                 frame = frame_det
             
-            # NEW: Add samples to pattern recognizer
-            pattern_recognizer.add_sample(gaze, pitch, ear)
+            # Scalar head angles, extracted once for all consumers below
+            pitch_deg = float(pitch[0]) if pitch is not None else None
+            yaw_deg = float(yaw[0]) if yaw is not None else None
+            roll_deg = float(roll[0]) if roll is not None else None
+            
+            # NEW: Add samples to pattern recognizer (plain floats, so its
+            # windows convert to flat arrays without per-element boxing)
+            pattern_recognizer.add_sample(gaze, pitch_deg, ear)
             
             # NEW: Analyze context to classify activity
             activity, is_distracted, distraction_severity = context_analyzer.analyze_context(
                 t_now=t_now,
-                head_pitch=pitch[0] if pitch is not None else None,
-                head_yaw=yaw[0] if yaw is not None else None,
-                head_roll=roll[0] if roll is not None else None,
+                head_pitch=pitch_deg,
+                head_yaw=yaw_deg,
+                head_roll=roll_deg,
                 gaze_score=gaze,
                 ear_score=ear,
                 detected_objects=detected_objects,
@@ -283,12 +428,12 @@ def main():
             )
             
             # NEW: Check for anomalies (spoofing detection)
-            if adaptive_scorer.detect_anomaly(ear, gaze, pitch[0] if pitch is not None else None):
+            if adaptive_scorer.detect_anomaly(ear, gaze, pitch_deg):
                 cv2.putText(
                     frame,
                     "WARNING: Unusual pattern detected",
                     (10, frame_size[1] - 20),
-                    cv2.FONT_HERSHEY_PLAIN,
+                    FONT,
                     1,
                     (0, 0, 255),
                     2,
@@ -323,52 +468,50 @@ def main():
             # Display metrics
             if ear is not None:
                 cv2.putText(frame, f"EAR: {ear:.3f}", (10, 50),
-                           cv2.FONT_HERSHEY_PLAIN, 2, (255, 255, 255), 1, cv2.LINE_AA)
+                           FONT, 2, (255, 255, 255), 1, cv2.LINE_AA)
             
             if gaze is not None:
                 cv2.putText(frame, f"Gaze: {gaze:.3f}", (10, 80),
-                           cv2.FONT_HERSHEY_PLAIN, 2, (255, 255, 255), 1, cv2.LINE_AA)
+                           FONT, 2, (255, 255, 255), 1, cv2.LINE_AA)
             
             cv2.putText(frame, f"PERCLOS: {perclos_score:.3f}", (10, 110),
-                       cv2.FONT_HERSHEY_PLAIN, 2, (255, 255, 255), 1, cv2.LINE_AA)
+                       FONT, 2, (255, 255, 255), 1, cv2.LINE_AA)
             
             # NEW: Display activity and detected objects
-            activity_display = activity.replace('_', ' ').title()
             color = (0, 255, 0) if not is_distracted else (0, 165, 255)
-            cv2.putText(frame, f"Activity: {activity_display}", (10, 140),
-                       cv2.FONT_HERSHEY_PLAIN, 1.5, color, 2, cv2.LINE_AA)
+            cv2.putText(frame, ACTIVITY_LABELS[activity], (10, 140),
+                       FONT, 1.5, color, 2, cv2.LINE_AA)
             
             # Display detected objects
             y_offset = 170
-            for obj_name, detected in detected_objects.items():
-                if detected:
-                    cv2.putText(frame, f"+ {obj_name.title()}", (10, y_offset),
-                               cv2.FONT_HERSHEY_PLAIN, 1, (0, 255, 255), 1, cv2.LINE_AA)
-                    y_offset += 20
+            for object_label in object_labels:
+                cv2.putText(frame, object_label, (10, y_offset),
+                           FONT, 1, (0, 255, 255), 1, cv2.LINE_AA)
+                y_offset += 20
             
             # Display head angles
             if roll is not None:
-                cv2.putText(frame, f"Roll: {roll.round(1)[0]}", (450, 40),
-                           cv2.FONT_HERSHEY_PLAIN, 1.5, (255, 0, 255), 1, cv2.LINE_AA)
+                cv2.putText(frame, f"Roll: {float(roll[0]):.1f}", (450, 40),
+                           FONT, 1.5, (255, 0, 255), 1, cv2.LINE_AA)
             if pitch is not None:
-                cv2.putText(frame, f"Pitch: {pitch.round(1)[0]}", (450, 70),
-                           cv2.FONT_HERSHEY_PLAIN, 1.5, (255, 0, 255), 1, cv2.LINE_AA)
+                cv2.putText(frame, f"Pitch: {float(pitch[0]):.1f}", (450, 70),
+                           FONT, 1.5, (255, 0, 255), 1, cv2.LINE_AA)
             if yaw is not None:
-                cv2.putText(frame, f"Yaw: {yaw.round(1)[0]}", (450, 100),
-                           cv2.FONT_HERSHEY_PLAIN, 1.5, (255, 0, 255), 1, cv2.LINE_AA)
+                cv2.putText(frame, f"Yaw: {float(yaw[0]):.1f}", (450, 100),
+                           FONT, 1.5, (255, 0, 255), 1, cv2.LINE_AA)
             
             # Display warnings
             if tired:
                 cv2.putText(frame, "TIRED!", (10, 280),
-                           cv2.FONT_HERSHEY_PLAIN, 1, (0, 0, 255), 1, cv2.LINE_AA)
+                           FONT, 1, (0, 0, 255), 1, cv2.LINE_AA)
             
             if asleep:
                 cv2.putText(frame, "ASLEEP!", (10, 300),
-                           cv2.FONT_HERSHEY_PLAIN, 1, (0, 0, 255), 1, cv2.LINE_AA)
+                           FONT, 1, (0, 0, 255), 1, cv2.LINE_AA)
             
             if looking_away_old:
                 cv2.putText(frame, "LOOKING AWAY!", (10, 320),
-                           cv2.FONT_HERSHEY_PLAIN, 1, (0, 0, 255), 1, cv2.LINE_AA)
+                           FONT, 1, (0, 0, 255), 1, cv2.LINE_AA)
             
             # NEW: Context-aware distraction handling
             # Exclude thinking and drinking water from distraction alerts
@@ -383,33 +526,21 @@ def main():
                 if activity == ActivityType.PHONE_DISTRACTION:
                     severity_text = f"PHONE DETECTED - Distracted!"
                     cv2.putText(frame, severity_text, (10, 340),
-                               cv2.FONT_HERSHEY_PLAIN, 1.5, (0, 0, 255), 2, cv2.LINE_AA)
+                               FONT, 1.5, (0, 0, 255), 2, cv2.LINE_AA)
                     
                     # Send to server immediately
                     if not last_distracted:
-                        try:
-                            requests.post(f"{SERVER_URL}/light",
-                                        json={"light_on": True}, timeout=0.75)
-                            requests.post(f"{SERVER_URL}/session/edge",
-                                        json={"distracted": True, "activity": activity, "severity": distraction_severity}, timeout=0.5)
-                        except Exception:
-                            pass
+                        notify_state(True, {"distracted": True, "activity": activity, "severity": distraction_severity})
                         last_distracted = True
                 
                 elif activity == "asleep":
                     severity_text = f"ASLEEP - Distracted!"
                     cv2.putText(frame, severity_text, (10, 340),
-                               cv2.FONT_HERSHEY_PLAIN, 1.5, (0, 0, 255), 2, cv2.LINE_AA)
+                               FONT, 1.5, (0, 0, 255), 2, cv2.LINE_AA)
                     
                     # Send to server immediately
                     if not last_distracted:
-                        try:
-                            requests.post(f"{SERVER_URL}/light",
-                                        json={"light_on": True}, timeout=0.75)
-                            requests.post(f"{SERVER_URL}/session/edge",
-                                        json={"distracted": True, "activity": activity, "severity": distraction_severity}, timeout=0.5)
-                        except Exception:
-                            pass
+                        notify_state(True, {"distracted": True, "activity": activity, "severity": distraction_severity})
                         last_distracted = True
                 
                 # Looking away: Flag after 15 seconds
@@ -417,53 +548,35 @@ def main():
                     if distraction_duration > 15.0:
                         severity_text = f"Looking Away {int(distraction_duration)}s - Distracted!"
                         cv2.putText(frame, severity_text, (10, 340),
-                                   cv2.FONT_HERSHEY_PLAIN, 1.5, (0, 0, 255), 2, cv2.LINE_AA)
+                                   FONT, 1.5, (0, 0, 255), 2, cv2.LINE_AA)
                         
                         # Send to server only if not already sent
                         if not last_distracted:
-                            try:
-                                requests.post(f"{SERVER_URL}/light",
-                                            json={"light_on": True}, timeout=0.75)
-                                requests.post(f"{SERVER_URL}/session/edge",
-                                            json={"distracted": True, "activity": activity, "severity": distraction_severity}, timeout=0.5)
-                            except Exception:
-                                pass
+                            notify_state(True, {"distracted": True, "activity": activity, "severity": distraction_severity})
                             last_distracted = True
                     else:
                         # Show countdown
                         remaining = 15.0 - distraction_duration
                         cv2.putText(frame, f"Looking Away ({remaining:.1f}s until alert)", (10, 340),
-                                   cv2.FONT_HERSHEY_PLAIN, 1, (255, 165, 0), 1, cv2.LINE_AA)
+                                   FONT, 1, (255, 165, 0), 1, cv2.LINE_AA)
                 
                 # Other distractions: Flag after 5 seconds (original behavior)
                 else:
                     if distraction_duration > 5.0:
                         severity_text = f"Distracted ({distraction_severity:.0%})"
                         cv2.putText(frame, severity_text, (10, 340),
-                                   cv2.FONT_HERSHEY_PLAIN, 1, (0, 0, 255), 1, cv2.LINE_AA)
+                                   FONT, 1, (0, 0, 255), 1, cv2.LINE_AA)
                         
                         # Send to server only if not already sent
                         if not last_distracted:
-                            try:
-                                requests.post(f"{SERVER_URL}/light",
-                                            json={"light_on": True}, timeout=0.75)
-                                requests.post(f"{SERVER_URL}/session/edge",
-                                            json={"distracted": True, "activity": activity, "severity": distraction_severity}, timeout=0.5)
-                            except Exception:
-                                pass
+                            notify_state(True, {"distracted": True, "activity": activity, "severity": distraction_severity})
                             last_distracted = True
             else:
                 # Reset distraction timer
                 distraction_start_time = None
                 
                 if last_distracted:
-                    try:
-                        requests.post(f"{SERVER_URL}/light",
-                                    json={"light_on": False}, timeout=0.75)
-                        requests.post(f"{SERVER_URL}/session/edge",
-                                    json={"distracted": False}, timeout=0.5)
-                    except Exception:
-                        pass
+                    notify_state(False, {"distracted": False})
                     last_distracted = False
         
         else:
@@ -482,62 +595,63 @@ def main():
         # Handle sustained face missing
         if face_missing_state:
             cv2.putText(frame, "FACE NOT DETECTED", (10, 340),
-                       cv2.FONT_HERSHEY_PLAIN, 1, (0, 0, 255), 1, cv2.LINE_AA)
+                       FONT, 1, (0, 0, 255), 1, cv2.LINE_AA)
             
             if last_face_detected:
-                try:
-                    requests.post(f"{SERVER_URL}/light",
-                                json={"light_on": True}, timeout=0.75)
-                    if time.perf_counter() - start_time >= 1.0:
-                        requests.post(f"{SERVER_URL}/session/edge",
-                                    json={"distracted": True}, timeout=0.5)
-                except Exception:
-                    pass
+                notify_state(True, {"distracted": True} if t_now - start_time >= 1.0 else None)
                 last_face_detected = False
         
         if face_present_state and not last_face_detected:
-            try:
-                requests.post(f"{SERVER_URL}/light",
-                            json={"light_on": False}, timeout=0.75)
-                if time.perf_counter() - start_time >= 1.0:
-                    requests.post(f"{SERVER_URL}/session/edge",
-                                json={"distracted": False}, timeout=0.5)
-            except Exception:
-                pass
+            notify_state(False, {"distracted": False} if t_now - start_time >= 1.0 else None)
             last_face_detected = True
         
         # Processing time
         e2 = cv2.getTickCount()
-        proc_time_frame_ms = ((e2 - e1) / cv2.getTickFrequency()) * 1000
+        proc_time_frame_ms = (e2 - e1) * tick_ms
         
         # Display FPS and processing time
         if args.show_fps:
-            cv2.putText(frame, f"FPS: {round(fps)}", (10, 400),
-                       cv2.FONT_HERSHEY_PLAIN, 2, (255, 0, 255), 1)
+            cv2.putText(frame, f"FPS: {fps}", (10, 400),
+                       FONT, 2, (255, 0, 255), 1)
         
         if args.show_proc_time:
             cv2.putText(frame, f"PROC: {round(proc_time_frame_ms, 0)}ms", (10, 430),
-                       cv2.FONT_HERSHEY_PLAIN, 2, (255, 0, 255), 1)
-        
-        # Show frame
-        cv2.imshow("Enhanced Study Focus Tracker - Press 'q' to quit", frame)
+                       FONT, 2, (255, 0, 255), 1)
         
-        # Check for quit
-        if cv2.waitKey(20) & 0xFF == ord('q'):
+        # Show frame and check for quit
+        if threaded_display:
+            put_latest(display_q, frame)
+            if quit_event.is_set():
+                break
+        elif args.show:
+            cv2.imshow(WINDOW_NAME, frame)
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                break
+        elif quit_event.is_set():
             break
         
         frame_count += 1
     
     # Cleanup
+    object_detector.close()
+    server_reporter.close()
+    grab_stop.set()
+    grab_thread.join()
     cap.release()
-    cv2.destroyAllWindows()
+    if threaded_display:
+        put_latest(display_q, None)
+        display_thread.join()
+    elif args.show:
+        cv2.destroyAllWindows()
     
-    # Finalize session
+    # Finalize session (queued behind pending notifications, so the stop
+    # arrives after the last edge)
     try:
-        requests.post(f"{SERVER_URL}/session/stop", json={}, timeout=0.5)
+        notifier.send("/session/stop", {}, timeout=0.5)
         print(f"Session stopped on server at {SERVER_URL}")
     except Exception as e:
         print(f"Warning: Could not notify server of session stop: {e}")
+    notifier.close()
     
     print(f"\nSession ended. Processed {frame_count} frames.")
     
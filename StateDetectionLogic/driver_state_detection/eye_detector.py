@@ -28,6 +28,9 @@ class EyeDetector:
         self.show_processing = show_processing
         # Eye landmarks numbers constants
         self.EYES_LMS_NUMS = [33, 133, 160, 144, 158, 153, 362, 263, 385, 380, 387, 373]
+        # same keypoints grouped as (eye, segment, endpoint) for the vectorized EAR:
+        # segment 0 is the eye length, segments 1 and 2 are the eye openings
+        self.EAR_SEGMENTS = np.array(self.EYES_LMS_NUMS).reshape(2, 3, 2)
         self.LEFT_IRIS_NUM = 468
         self.RIGHT_IRIS_NUM = 473
 
@@ -98,24 +101,19 @@ class EyeDetector:
             Each eye has his scores and the two scores are averaged
         """
 
-        # numpy array for storing the keypoints positions of the left and right eyes
-        eye_pts_l = np.zeros(shape=(6, 2))
-        eye_pts_r = eye_pts_l.copy()
+        # gather the keypoints of both eyes in a single indexing operation,
+        # shape (2 eyes, 3 segments, 2 endpoints, 2 coords)
+        eye_pts = landmarks[self.EAR_SEGMENTS, :2]
 
-        # get the face mesh keypoints
-        for i in range(len(self.EYES_LMS_NUMS) // 2):
-            # array of x,y coordinates for the left eye reference point
-            eye_pts_l[i] = landmarks[self.EYES_LMS_NUMS[i], :2]
-            # array of x,y coordinates for the right eye reference point
-            eye_pts_r[i] = landmarks[self.EYES_LMS_NUMS[i + 6], :2]
+        # lengths of the eye length and eye opening segments of both eyes at once
+        seg = eye_pts[:, :, 0] - eye_pts[:, :, 1]
+        seg_len = np.sqrt((seg * seg).sum(axis=-1))
 
-        # computing the left eye EAR score
-        ear_left = self._calc_EAR_eye(eye_pts_l)
-        # computing the right eye EAR score
-        ear_right = self._calc_EAR_eye(eye_pts_r)
+        # EAR of each eye (same formula as _calc_EAR_eye)
+        ear_eyes = (seg_len[:, 1] + seg_len[:, 2]) / (2 * seg_len[:, 0])
 
         # computing the average EAR score
-        ear_avg = (ear_left + ear_right) / 2
+        ear_avg = (ear_eyes[0] + ear_eyes[1]) / 2
 
         return ear_avg
 
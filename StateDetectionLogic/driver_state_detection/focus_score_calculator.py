@@ -58,9 +58,12 @@ Do NOT import or use this module from Android. Its for server-side use only.
 
 from __future__ import annotations
 
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 from typing import Optional, Tuple
 import os
+import threading
+import time
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -68,6 +71,7 @@ from dotenv import load_dotenv
 import firebase_admin
 from firebase_admin import firestore as admin_firestore
 from firebase_admin import credentials
+from google.api_core import exceptions as google_exceptions
 from google.cloud import firestore
 
 # Load environment variables from .env file
@@ -89,31 +93,185 @@ else:
 # Default set to 3000 ms (3 seconds). Override with env var DISTRACTED_COUNTER_ERROR_MS.
 DISTRACTED_COUNTER_ERROR_MS = int(os.getenv("DISTRACTED_COUNTER_ERROR_MS", "3000"))
 
+# Write-behind session creation: transient Firestore errors are retried with
+# exponential backoff (START_WRITE_BACKOFF_S, doubled after each attempt).
+START_WRITE_ATTEMPTS = 4
+START_WRITE_BACKOFF_S = 0.1
+_RETRYABLE_ERRORS = (
+    google_exceptions.Aborted,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.ServiceUnavailable,
+)
+
 
 def _utcnow() -> datetime:
     return datetime.now(timezone.utc)
 
 
+# Firebase Admin app and Firestore client, created once per process and
+# shared by every SessionServerStore (double-checked under _INIT_LOCK)
+_INIT_LOCK = threading.Lock()
+_initialized = False
+_client: Optional[admin_firestore.Client] = None
+
+
 def _ensure_firebase_initialized() -> None:
     """Initialize Firebase Admin with an explicit service account JSON path.
 
-    Uses SERVICE_ACCOUNT_KEY_PATH defined at module level.
+    Uses SERVICE_ACCOUNT_KEY_PATH defined at module level. Thread-safe and a
+    no-op after the first successful call.
     """
-    try:
-        firebase_admin.get_app()
+    global _initialized
+    if _initialized:
         return
-    except ValueError:
-        pass
-
-    key_path = SERVICE_ACCOUNT_KEY_PATH
-    if not key_path:
-        raise RuntimeError(
-            "SERVICE_ACCOUNT_KEY_PATH is empty. Set it to the absolute path of your "
-            "Firebase service account JSON in focus_score_calculator.py."
-        )
 
-    cred = credentials.Certificate(key_path)
-    firebase_admin.initialize_app(cred)
+    with _INIT_LOCK:
+        if _initialized:
+            return
+
+        try:
+            firebase_admin.get_app()
+        except ValueError:
+            key_path = SERVICE_ACCOUNT_KEY_PATH
+            if not key_path:
+                raise RuntimeError(
+                    "SERVICE_ACCOUNT_KEY_PATH is empty. Set it to the absolute path of your "
+                    "Firebase service account JSON in focus_score_calculator.py."
+                )
+
+            cred = credentials.Certificate(key_path)
+            firebase_admin.initialize_app(cred)
+
+        _initialized = True
+
+
+def _get_client() -> admin_firestore.Client:
+    """Return the process-wide Firestore client, initializing Firebase on first use."""
+    global _client
+    if _client is None:
+        _ensure_firebase_initialized()
+        with _INIT_LOCK:
+            if _client is None:
+                _client = admin_firestore.client()
+    return _client
+
+
+def _set_with_retry(doc_ref, payload: dict) -> None:
+    """doc_ref.set(payload), retrying transient errors with exponential backoff."""
+    for attempt in range(START_WRITE_ATTEMPTS):
+        try:
+            doc_ref.set(payload)
+            return
+        except _RETRYABLE_ERRORS:
+            if attempt == START_WRITE_ATTEMPTS - 1:
+                raise
+            time.sleep(START_WRITE_BACKOFF_S * 2 ** attempt)
+
+
+def _wait_for_create(state: dict) -> None:
+    """Block until the session's write-behind create has landed (re-raising its error)."""
+    pending = state.get("create")
+    if pending is not None:
+        pending.result()
+        state["create"] = None
+
+
+def _state_from_snapshot(snap) -> dict:
+    """Build the cached edge state of a session from its Firestore snapshot."""
+    data = snap.to_dict() or {}
+    return {
+        "exists": bool(data),
+        "status": data.get("status"),
+        "current_interval_start": data.get("currentIntervalStart"),
+        "current_activity": data.get("currentActivity", "unknown"),
+        "current_severity": data.get("currentSeverity", 0.5),
+        "interval_count": int(data.get("intervalCount", 0) or 0),
+    }
+
+
+def _open_interval(writer, session_ref, state: dict, start_at: datetime,
+                   activity: str, severity: float) -> bool:
+    """Queue the write that opens a distracted interval on a batch or transaction.
+
+    Returns False (and writes nothing) if the session is finished or an interval
+    is already open.
+    """
+    if state["status"] == "completed" or state["current_interval_start"] is not None:
+        return False
+    writer.update(
+        session_ref,
+        {
+            "currentIntervalStart": start_at,
+            "currentActivity": activity,
+            "currentSeverity": severity,
+            "lastUpdated": firestore.SERVER_TIMESTAMP,
+        }
+    )
+    return True
+
+
+def _close_interval(writer, session_ref, interval_ref, state: dict, end_at: datetime) -> Optional[int]:
+    """Queue the interval doc and aggregate writes that close the open interval.
+
+    Returns the interval duration in ms, or None (and writes nothing) if there
+    is no open interval to close.
+    """
+    if not state["exists"] or state["status"] == "completed":
+        return None
+
+    start_at = state["current_interval_start"]
+    if not start_at:
+        return None  # nothing to close
+
+    # Compute duration and next idx
+    duration_ms = int((end_at - start_at).total_seconds() * 1000)
+    # Apply configured error margin to account for detection latency (if any)
+    if DISTRACTED_COUNTER_ERROR_MS:
+        duration_ms = int(duration_ms + DISTRACTED_COUNTER_ERROR_MS)
+
+    # Create interval document with activity and severity
+    writer.set(
+        interval_ref,
+        {
+            "startAt": start_at,
+            "endAt": end_at,
+            "durationMs": duration_ms,
+            "idx": state["interval_count"] + 1,
+            "activity": state["current_activity"],
+            "severity": state["current_severity"],
+            "source": "state-detector",
+            "createdAt": firestore.SERVER_TIMESTAMP,
+        }
+    )
+
+    # Update aggregates and clear open marker
+    writer.update(
+        session_ref,
+        {
+            "distractedTotalMs": firestore.Increment(duration_ms),
+            "intervalCount": firestore.Increment(1),
+            "currentIntervalStart": firestore.DELETE_FIELD,
+            "currentActivity": firestore.DELETE_FIELD,
+            "currentSeverity": firestore.DELETE_FIELD,
+            "lastUpdated": firestore.SERVER_TIMESTAMP,
+        }
+    )
+
+    return duration_ms
+
+
+@firestore.transactional
+def _open_interval_tx(transaction, session_ref, start_at, activity, severity) -> Tuple[dict, bool]:
+    """Read the session and open an interval atomically (retried on contention)."""
+    state = _state_from_snapshot(session_ref.get(transaction=transaction))
+    return state, _open_interval(transaction, session_ref, state, start_at, activity, severity)
+
+
+@firestore.transactional
+def _close_interval_tx(transaction, session_ref, interval_ref, end_at) -> Tuple[dict, Optional[int]]:
+    """Read the session and close its open interval atomically (retried on contention)."""
+    state = _state_from_snapshot(session_ref.get(transaction=transaction))
+    return state, _close_interval(transaction, session_ref, interval_ref, state, end_at)
 
 
 class SessionServerStore:
@@ -123,10 +281,33 @@ class SessionServerStore:
     increments to remain consistent under concurrent calls.
     """
 
+    # Per-session mirror of the fields the edge handlers need, so the hot path
+    # skips the session_ref.get() round-trip and commits one batch. Shared by
+    # all instances: only this process writes these fields. Each session has
+    # its own lock that makes an edge's check-and-write atomic across request
+    # threads, so a slow Firestore call only holds up edges of that session;
+    # _lock just guards the two dicts. A miss (e.g. after a server restart)
+    # runs the read-modify-write in a Firestore transaction.
+    _sessions: dict[str, dict] = {}
+    _session_locks: dict[str, threading.RLock] = {}
+    _lock = threading.Lock()
+
     def __init__(self) -> None:
-        _ensure_firebase_initialized()
-        # The Admin SDK exposes a google.cloud.firestore client
-        self._db: admin_firestore.Client = admin_firestore.client()
+        # The Admin SDK exposes a google.cloud.firestore client; one client
+        # (and its connection pool) is shared by all stores
+        self._db: admin_firestore.Client = _get_client()
+        # Runs the write-behind session creates off the request thread
+        self._pool = ThreadPoolExecutor(max_workers=4)
+
+    def close(self) -> None:
+        """Wait for the pending write-behind session creates, then stop their worker threads."""
+        self._pool.shutdown(wait=True)
+
+    @classmethod
+    def _session_lock(cls, session_id: str) -> threading.RLock:
+        """The lock serializing the edges (and the stop) of one session."""
+        with cls._lock:
+            return cls._session_locks.setdefault(session_id, threading.RLock())
 
     # ---------------------- Session lifecycle ----------------------
     def start_session(
@@ -139,6 +320,8 @@ class SessionServerStore:
         """Create a new sessionServer document and return its id.
 
         If session_id is provided, uses it; otherwise, generates an auto id.
+        The id is returned right away and the document is written in the
+        background; edge and stop calls for the session wait for that write.
         """
         started_at = started_at or _utcnow()
 
@@ -148,7 +331,9 @@ class SessionServerStore:
             else self._db.collection(SESSION_COLLECTION).document()
         )
 
-        doc_ref.set(
+        create = self._pool.submit(
+            _set_with_retry,
+            doc_ref,
             {
                 "userId": user_id,
                 "username": username,
@@ -160,9 +345,20 @@ class SessionServerStore:
                 "focusScore": None,
                 "status": "active",
                 "lastUpdated": firestore.SERVER_TIMESTAMP,
-            }
+            },
         )
 
+        with self._lock:
+            self._sessions[doc_ref.id] = {
+                "exists": True,
+                "status": "active",
+                "current_interval_start": None,
+                "current_activity": "unknown",
+                "current_severity": 0.5,
+                "interval_count": 0,
+                "create": create,
+            }
+
         return doc_ref.id
 
     def stop_session(
@@ -177,6 +373,11 @@ class SessionServerStore:
         stopped_at = stopped_at or _utcnow()
         session_ref = self._db.collection(SESSION_COLLECTION).document(session_id)
 
+        with self._session_lock(session_id):
+            return self._finalize(session_id, session_ref, stopped_at)
+
+    def _finalize(self, session_id: str, session_ref, stopped_at: datetime) -> Tuple[int, float]:
+        """stop_session() body, run under the session's lock."""
         # Close any open interval prior to finalizing
         self.mark_focused(session_id, end_at=stopped_at)
 
@@ -204,6 +405,9 @@ class SessionServerStore:
                 "lastUpdated": firestore.SERVER_TIMESTAMP,
             }
         )
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            self._session_locks.pop(session_id, None)
 
         return elapsed_ms, focus_score
 
@@ -227,24 +431,31 @@ class SessionServerStore:
         """
         start_at = start_at or _utcnow()
         session_ref = self._db.collection(SESSION_COLLECTION).document(session_id)
-        # Non-transactional, simple guard on currentIntervalStart.
-        # Safe enough since edges are serialized per session in our server.
-        snap = session_ref.get()
-        data = snap.to_dict() or {}
 
-        if data.get("status") == "completed":
-            return  # ignore if already finished
-
-        if data.get("currentIntervalStart") is None:
-            session_ref.update(
-                {
-                    "currentIntervalStart": start_at,
-                    "currentActivity": activity,
-                    "currentSeverity": severity,
-                    "lastUpdated": firestore.SERVER_TIMESTAMP,
-                }
-            )
-        # else: interval already open, ignore
+        # Firestore I/O runs under the session's lock only; _lock is held
+        # just for the cache lookup and update
+        with self._session_lock(session_id):
+            with self._lock:
+                state = self._sessions.get(session_id)
+            if state is None:
+                state, opened = _open_interval_tx(
+                    self._db.transaction(), session_ref, start_at, activity, severity
+                )
+                with self._lock:
+                    self._sessions[session_id] = state
+            else:
+                _wait_for_create(state)
+                batch = self._db.batch()
+                opened = _open_interval(batch, session_ref, state, start_at, activity, severity)
+                if opened:
+                    batch.commit()
+            # else: finished session or interval already open, ignore
+
+            if opened:
+                with self._lock:
+                    state["current_interval_start"] = start_at
+                    state["current_activity"] = activity
+                    state["current_severity"] = severity
 
     def mark_focused(self, session_id: str, end_at: Optional[datetime] = None) -> Optional[int]:
         """Record the end of a distracted interval (true -> false edge).
@@ -254,56 +465,31 @@ class SessionServerStore:
         """
         end_at = end_at or _utcnow()
         session_ref = self._db.collection(SESSION_COLLECTION).document(session_id)
-        intervals_col = session_ref.collection("distractedIntervals")
-
-        # Non-transactional close: compute, write interval, then update aggregates.
-        snap = session_ref.get()
-        data = snap.to_dict() or {}
-
-        if not data or data.get("status") == "completed":
-            return None
-
-        start_at = data.get("currentIntervalStart")
-        if not start_at:
-            return None  # nothing to close
-
-        # Compute duration and next idx
-        duration_ms = int((end_at - start_at).total_seconds() * 1000)
-        # Apply configured error margin to account for detection latency (if any)
-        if DISTRACTED_COUNTER_ERROR_MS:
-            duration_ms = int(duration_ms + DISTRACTED_COUNTER_ERROR_MS)
-        idx = int(data.get("intervalCount", 0) or 0) + 1
-
-        # Get activity and severity from current interval
-        activity = data.get("currentActivity", "unknown")
-        severity = data.get("currentSeverity", 0.5)
-        
-        # Create interval document with activity and severity
-        interval_ref = intervals_col.document()
-        interval_ref.set(
-            {
-                "startAt": start_at,
-                "endAt": end_at,
-                "durationMs": duration_ms,
-                "idx": idx,
-                "activity": activity,
-                "severity": severity,
-                "source": "state-detector",
-                "createdAt": firestore.SERVER_TIMESTAMP,
-            }
-        )
-
-        # Update aggregates and clear open marker
-        session_ref.update(
-            {
-                "distractedTotalMs": firestore.Increment(duration_ms),
-                "intervalCount": firestore.Increment(1),
-                "currentIntervalStart": firestore.DELETE_FIELD,
-                "currentActivity": firestore.DELETE_FIELD,
-                "currentSeverity": firestore.DELETE_FIELD,
-                "lastUpdated": firestore.SERVER_TIMESTAMP,
-            }
-        )
+        interval_ref = session_ref.collection("distractedIntervals").document()
+
+        # The interval doc and the aggregates are written in one commit
+        with self._session_lock(session_id):
+            with self._lock:
+                state = self._sessions.get(session_id)
+            if state is None:
+                state, duration_ms = _close_interval_tx(
+                    self._db.transaction(), session_ref, interval_ref, end_at
+                )
+                with self._lock:
+                    self._sessions[session_id] = state
+            else:
+                _wait_for_create(state)
+                batch = self._db.batch()
+                duration_ms = _close_interval(batch, session_ref, interval_ref, state, end_at)
+                if duration_ms is not None:
+                    batch.commit()
+
+            if duration_ms is not None:
+                with self._lock:
+                    state["current_interval_start"] = None
+                    state["current_activity"] = "unknown"
+                    state["current_severity"] = 0.5
+                    state["interval_count"] += 1
 
         return duration_ms
 
@@ -0,0 +1,123 @@
+"""
+Background HTTP notifier
+Sends server notifications from a worker thread so the capture loop never
+waits on the network
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class HttpNotifier:
+    """
+    Queues POST requests and sends them in order from a daemon thread that
+    owns a persistent requests.Session (keep-alive connection reuse). post()
+    is fire-and-forget; send() waits for its response.
+    """
+
+    # Extra seconds send() waits for the posts queued ahead of its request
+    DRAIN_ALLOWANCE = 2.0
+    
+    def __init__(self, server_url: str, maxsize: int = 64, log_interval: float = 1.0):
+        """
+        Initialize and start the notifier.
+
+        Parameters
+        ----------
+        server_url : str
+            Base URL that endpoints are appended to
+        maxsize : int
+            Maximum number of pending requests; further posts are dropped
+        log_interval : float
+            Minimum seconds between two failure warnings, so a server that is
+            down does not turn into a warning per frame
+        """
+        self.server_url = server_url
+        self.log_interval = log_interval
+        self._last_log = float("-inf")
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._thread = threading.Thread(target=self._worker, daemon=True)
+        self._thread.start()
+
+    def post(self, endpoint: str, payload: dict, timeout: float = 0.5):
+        """Queue a JSON POST to server_url + endpoint (never blocks)."""
+        try:
+            self._queue.put_nowait((endpoint, payload, timeout, None))
+        except queue.Full:
+            self._warn(f"Warning: notification queue full, dropping POST {endpoint}")
+
+    def send(self, endpoint: str, payload: dict, timeout: float = 0.5) -> requests.Response:
+        """
+        POST through the worker's session and wait for the response.
+
+        The request goes out after everything already queued and reuses the
+        same keep-alive connection. Exceptions raised by the request (e.g.
+        connection errors) are re-raised here. At most timeout +
+        DRAIN_ALLOWANCE seconds are spent waiting for the response; past
+        that the request is withdrawn and concurrent.futures.TimeoutError
+        is raised.
+
+        Parameters
+        ----------
+        endpoint : str
+            Path appended to server_url
+        payload : dict
+            JSON body
+        timeout : float
+            Request timeout in seconds
+        """
+        if not self._thread.is_alive():
+            raise RuntimeError("HttpNotifier is closed")
+        future = Future()
+        self._queue.put((endpoint, payload, timeout, future), timeout=timeout)
+        try:
+            return future.result(timeout=timeout + self.DRAIN_ALLOWANCE)
+        except FutureTimeoutError:
+            # If it is still queued behind a slow backlog, the worker skips it
+            future.cancel()
+            raise
+
+    def _warn(self, message: str):
+        """Print a warning at most once per log_interval seconds."""
+        now = time.monotonic()
+        if now - self._last_log >= self.log_interval:
+            self._last_log = now
+            print(message)
+
+    def _worker(self):
+        with requests.Session() as session:
+            # a single thread uses the session: one pooled connection, no retries
+            session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=Retry(total=0, connect=0, read=0)))
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                endpoint, payload, timeout, future = item
+                if future is not None and not future.set_running_or_notify_cancel():
+                    continue  # send() gave up waiting
+                try:
+                    response = session.post(f"{self.server_url}{endpoint}", json=payload, timeout=timeout)
+                except Exception as e:
+                    if future is not None:
+                        future.set_exception(e)
+                    else:
+                        # Server unavailable - keep detecting regardless
+                        self._warn(f"Warning: POST {endpoint} failed: {e}")
+                else:
+                    if future is not None:
+                        future.set_result(response)
+
+    def close(self, timeout: Optional[float] = 5.0):
+        """Send everything still queued, then stop the worker thread."""
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
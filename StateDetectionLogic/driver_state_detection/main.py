@@ -1,11 +1,10 @@
+import queue
+import signal
+import threading
 import time
-import pprint
-import requests
-import datetime
 
 import cv2
 import mediapipe as mp
-import numpy as np
 
 
 try:
@@ -13,16 +12,16 @@ try:
     from .eye_detector import EyeDetector as EyeDet
     from .parser import get_args
     from .pose_estimation import HeadPoseEstimator as HeadPoseEst
-    from .utils import get_landmarks, load_camera_parameters
-    # from . import state
+    from .utils import configure_capture, get_landmarks, load_camera_parameters, open_capture, put_latest
+    from .http_notifier import HttpNotifier
 except ImportError:
     # Fallback for running this file directly as a script
     from attention_scorer import AttentionScorer as AttScorer
     from eye_detector import EyeDetector as EyeDet
     from parser import get_args
     from pose_estimation import HeadPoseEstimator as HeadPoseEst
-    from utils import get_landmarks, load_camera_parameters
-    # import state  # type: ignore
+    from utils import configure_capture, get_landmarks, load_camera_parameters, open_capture, put_latest
+    from http_notifier import HttpNotifier
 
 
 
@@ -43,6 +42,8 @@ def main():
         camera_matrix, dist_coeffs = None, None
 
     if args.verbose:
+        import pprint  # only needed for the verbose dump
+
         print("Arguments and Parameters used:\n")
         pprint.pp(vars(args), indent=4)
         print("\nCamera Matrix:")
@@ -69,11 +70,12 @@ def main():
         show_axis=args.show_axis, camera_matrix=camera_matrix, dist_coeffs=dist_coeffs
     )
 
-    # timing variables
-    prev_time = time.perf_counter()
+    # timing variables: integer nanoseconds from the monotonic clock; t_now is
+    # the same clock in float seconds for the scorer APIs
+    prev_ns = time.monotonic_ns()
     fps = 0.0  # Initial FPS value
 
-    t_now = time.perf_counter()
+    t_now = prev_ns * 1e-9
 
     # instantiation of the attention scorer object, with the various thresholds
     # NOTE: set verbose to True for additional printed information about the scores
@@ -90,11 +92,14 @@ def main():
         verbose=args.verbose,
     )
 
-    # capture the input from the default system camera (camera number 0)
-    cap = cv2.VideoCapture(args.camera)
+    # capture the input from the default system camera (camera number 0) with
+    # the native backend of the platform
+    cap = open_capture(args.camera, args.capture_backend)
     if not cap.isOpened():  # if the camera can't be opened exit the program
         print("Cannot open camera")
         exit()
+    # smaller frames and no driver-side queue of stale frames
+    configure_capture(cap, args.capture_size)
 
     # time.sleep(0.01)  # To prevent zero division error when calculating the FPS
 
@@ -105,53 +110,113 @@ def main():
     face_not_detected_time = 0.0
     face_detected_time = 0.0
 
-    # Notify server to start a focus-scoring session (non-blocking, safe if server not running)
+    # edge notifications are posted from a background thread so a slow or
+    # missing server never stalls the capture loop; session start/stop go
+    # through the same keep-alive connection
+    notifier = HttpNotifier("http://127.0.0.1:3000")
+
+    # Notify server to start a focus-scoring session (safe if server not running)
     try:
-        requests.post("http://127.0.0.1:3000/session/start", json={}, timeout=0.5)
+        notifier.send("/session/start", {}, timeout=0.5)
     except Exception:
         pass
 
+    def emit_edge(distracted, record_session=True):
+        """One POST /state per edge: the light follows the state, and the session
+        edge is recorded in the same request unless record_session is False."""
+        payload = {"light_on": distracted}
+        if record_session:
+            payload["distracted"] = distracted
+        notifier.post("/state", payload, timeout=0.75)
+
     # startup warmup: suppress session edge posts for the first second
-    start_time = time.perf_counter()
+    start_time = time.monotonic_ns() * 1e-9
+
+    # face mesh temporal subsampling: run the model every detect_stride frames
+    # (or when its last result is older than mesh_max_age seconds) and reuse
+    # the previous landmarks and scores on the frames in between
+    detect_stride = max(1, args.detect_stride)
+    mesh_max_age = 0.2
+    frame_idx = 0
+    last_mesh_time = float("-inf")
+    lms = None
+
+    # headless runs have no window to press 'q' in, so Ctrl+C ends the loop
+    # instead and the cleanup below (session stop) still runs
+    interrupted = False
+
+    def _on_sigint(signum, frame):
+        nonlocal interrupted
+        interrupted = True
+
+    # configuration read once instead of looked up on the args namespace every frame
+    face_missing_thresh = float(getattr(args, "face_missing_time_thresh", 2.5))
+    show = args.show
+    show_fps = args.show_fps
+    show_proc_time = args.show_proc_time
+
+    if not show:
+        signal.signal(signal.SIGINT, _on_sigint)
+
+    # capture thread: cap.read() (USB transfer + decode) overlaps with the face
+    # mesh inference of the previous frame. The 1-slot queue keeps only the
+    # newest frame; None signals that the camera stopped delivering frames
+    frame_q = queue.Queue(maxsize=1)
+    grab_stop = threading.Event()
+    mirror = args.camera == 0
+
+    def grab_frames():
+        while not grab_stop.is_set():
+            ret, grabbed = cap.read()
+            # if the frame comes from webcam, flip it so it looks like a mirror
+            # (in place: each read returns a new buffer owned by this thread)
+            if ret and mirror:
+                cv2.flip(grabbed, 1, dst=grabbed)
+            put_latest(frame_q, grabbed if ret else None)
+            if not ret:
+                break
+
+    grab_thread = threading.Thread(target=grab_frames, daemon=True)
+    grab_thread.start()
 
     while True:  # infinite loop for webcam video capture
-        # get current time in seconds
-        t_now = time.perf_counter()
+        # get current time (ns, and in seconds)
+        t_now_ns = time.monotonic_ns()
+        t_now = t_now_ns * 1e-9
 
         # Calculate the time taken to process the previous frame
-        elapsed_time = t_now - prev_time
-        prev_time = t_now
+        elapsed_ns = t_now_ns - prev_ns
+        prev_ns = t_now_ns
+        elapsed_time = elapsed_ns * 1e-9
 
         # calculate FPS
-        if elapsed_time > 0:
-            fps = np.round(1 / elapsed_time, 3)
+        if elapsed_ns > 0:
+            fps = 1_000_000_000 / elapsed_ns
 
-        ret, frame = cap.read()  # read a frame from the webcam
+        frame = frame_q.get()  # newest frame from the capture thread
 
-        if not ret:  # if a frame can't be read, exit the program
+        if frame is None:  # if a frame can't be read, exit the program
             print("Can't receive frame from camera/stream end")
             break
 
-        # if the frame comes from webcam, flip it so it looks like a mirror.
-        if args.camera == 0:
-            frame = cv2.flip(frame, 2)
-
         # start the tick counter for computing the processing time for each frame
         e1 = cv2.getTickCount()
 
-        # transform the BGR frame in grayscale
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-
         # get the frame size
         frame_size = frame.shape[1], frame.shape[0]
 
-        # apply a bilateral filter to lower noise but keep frame details. create a 3D matrix from gray image to give it to the model
-        # gray = cv2.bilateralFilter(gray, 5, 10, 10)
-        gray = np.expand_dims(gray, axis=2)
-        gray = np.concatenate([gray, gray, gray], axis=2)
+        run_mesh = frame_idx % detect_stride == 0 or t_now - last_mesh_time > mesh_max_age
+        frame_idx += 1
 
-        # find the faces using the face mesh model
-        lms = Detector.process(gray).multi_face_landmarks
+        if run_mesh:
+            # MediaPipe expects RGB; a single cvtColor pass replaces the old
+            # gray -> expand_dims -> concatenate 3-channel copy
+            rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            rgb.flags.writeable = False
+
+            # find the faces using the face mesh model
+            lms = Detector.process(rgb).multi_face_landmarks
+            last_mesh_time = t_now
         # true if face detected (lms not None), false otherwise
         face_detected = bool(lms)
 
@@ -164,8 +229,8 @@ def main():
             face_not_detected_time = 0.0
 
         # decide whether the face has been missing/present for the configured threshold
-        face_missing_state = face_not_detected_time >= getattr(args, "face_missing_time_thresh", 2.5)
-        face_present_state = face_detected_time >= getattr(args, "face_missing_time_thresh", 2.5)
+        face_missing_state = face_not_detected_time >= face_missing_thresh
+        face_present_state = face_detected_time >= face_missing_thresh
 
         # show the on-screen message only when the face has been missing long enough
         if face_missing_state:
@@ -181,63 +246,51 @@ def main():
             )
 
         # If face was preciously detected but now is not detected, send signal to start timing distracted
+        # (the session edge is skipped during the first-second warmup)
         if face_missing_state and last_face_detected:
-            payload = {"light_on": True}
-            try:
-                requests.post("http://127.0.0.1:3000/light", json=payload, timeout=0.75)
-            except Exception:
-                # Ignore network errors to avoid breaking the loop
-                pass
-            # Also record the distracted edge to the server's session API (fire-and-forget)
-            if time.perf_counter() - start_time >= 1.0:
-                try:
-                    requests.post("http://127.0.0.1:3000/session/edge", json={"distracted": True}, timeout=0.5)
-                except Exception:
-                    pass
+            emit_edge(True, record_session=t_now - start_time >= 1.0)
             last_face_detected = False
 
         # If face was previoulsy not detected but is now detected, ...
         if face_present_state and not last_face_detected:
-            payload = {"light_on": False}
-            try:
-                requests.post("http://127.0.0.1:3000/light", json=payload, timeout=0.75)
-            except Exception:
-                # Ignore network errors to avoid breaking the loop
-                pass
-            # Record the focused edge (close interval)
-            if time.perf_counter() - start_time >= 1.0:
-                try:
-                    requests.post("http://127.0.0.1:3000/session/edge", json={"distracted": False}, timeout=0.5)
-                except Exception:
-                    pass
+            emit_edge(False, record_session=t_now - start_time >= 1.0)
             last_face_detected = True
 
         if lms:  # process the frame only if at least a face is found
-            # getting face landmarks and then take only the bounding box of the biggest face
-            landmarks = get_landmarks(lms)
+            if run_mesh:
+                # getting face landmarks and then take only the bounding box of the biggest face
+                landmarks = get_landmarks(lms)
+
+                # grayscale is only needed for the gaze eye crops; convert before
+                # anything is drawn, and skip it on frames without a face
+                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+                # compute the EAR score of the eyes
+                ear = Eye_det.get_EAR(landmarks=landmarks)
+
+                # compute the Gaze Score
+                gaze = Eye_det.get_Gaze_Score(
+                    frame=gray, landmarks=landmarks, frame_size=frame_size
+                )
+
+                # compute the head pose
+                frame_det, roll, pitch, yaw = Head_pose.get_pose(
+                    frame=frame, landmarks=landmarks, frame_size=frame_size
+                )
+            else:
+                # reused landmarks: keep the last EAR, gaze and pose scores
+                # (the head pose axes are only drawn on detection frames)
+                frame_det = None
 
             # shows the eye keypoints (can be commented)
             Eye_det.show_eye_keypoints(
                 color_frame=frame, landmarks=landmarks, frame_size=frame_size
             )
 
-            # compute the EAR score of the eyes
-            ear = Eye_det.get_EAR(landmarks=landmarks)
-
             # compute the *rolling* PERCLOS score and state of tiredness
             # if you don't want to use the rolling PERCLOS, use the get_PERCLOS method instead
             tired, perclos_score = Scorer.get_rolling_PERCLOS(t_now, ear)
 
-            # compute the Gaze Score
-            gaze = Eye_det.get_Gaze_Score(
-                frame=gray, landmarks=landmarks, frame_size=frame_size
-            )
-
-            # compute the head pose
-            frame_det, roll, pitch, yaw = Head_pose.get_pose(
-                frame=frame, landmarks=landmarks, frame_size=frame_size
-            )
-
             # evaluate the scores for EAR, GAZE and HEAD POSE
             asleep, looking_away, distracted = Scorer.eval_scores(
                 t_now=t_now,
@@ -360,11 +413,6 @@ def main():
                     1,
                     cv2.LINE_AA,
                 )
-            # # shared module state copies local variable state to be read by the esp32s (wristband/light)
-            # try:
-            #     state.distracted = bool(distracted)
-            # except Exception:
-            #     pass
             if distracted:
                 cv2.putText(
                     frame,
@@ -378,37 +426,12 @@ def main():
                     
                 )
 
-            #executes if distracted is true, and last distracted is false
-            #prevents sending multiple post requests while distracted is true
-            # Rising-edge trigger: send once when distracted flips False -> True
-            #True edge detection for turning on and off the light
-
-            if distracted and not last_distracted :
-                payload= {"light_on":True}
-                try:
-                    requests.post("http://127.0.0.1:3000/light",json=payload, timeout=0.75)
-                except Exception:
-                    # Ignore network errors to avoid breaking the loop
-                    pass
-                # Also record the distracted edge to the server's session API (fire-and-forget)
-                try:
-                    requests.post("http://127.0.0.1:3000/session/edge", json={"distracted": True}, timeout=0.5)
-                except Exception:
-                    pass
-                last_distracted = distracted
-
-            if not distracted and last_distracted :
-                payload={"light_on":False}
-                try:
-                     requests.post("http://127.0.0.1:3000/light",json=payload, timeout=0.75)
-                except Exception:
-                    # Ignore network errors to avoid breaking the loop
-                    pass
-                # Record the focused edge (close interval)
-                try:
-                    requests.post("http://127.0.0.1:3000/session/edge", json={"distracted": False}, timeout=0.5)
-                except Exception:
-                    pass
+            # Edge trigger: send once when distracted flips (False -> True turns
+            # the light on and opens an interval, True -> False closes it), so
+            # no repeated posts while the state holds
+
+            if distracted != last_distracted:
+                emit_edge(bool(distracted))
 
             # Update edge detector
             last_distracted = distracted
@@ -418,7 +441,7 @@ def main():
         # processign time in milliseconds
         proc_time_frame_ms = ((e2 - e1) / cv2.getTickFrequency()) * 1000
         # print fps and processing time per frame on screen
-        if args.show_fps:
+        if show_fps:
             cv2.putText(
                 frame,
                 "FPS:" + str(round(fps)),
@@ -428,7 +451,7 @@ def main():
                 (255, 0, 255),
                 1,
             )
-        if args.show_proc_time:
+        if show_proc_time:
             cv2.putText(
                 frame,
                 "PROC. TIME FRAME:" + str(round(proc_time_frame_ms, 0)) + "ms",
@@ -439,21 +462,30 @@ def main():
                 1,
             )
 
-        # show the frame on screen
-        cv2.imshow("Press 'q' to terminate", frame)
+        if show:
+            # show the frame on screen
+            cv2.imshow("Press 'q' to terminate", frame)
 
-        # if the key "q" is pressed on the keyboard, the program is terminated
-        if cv2.waitKey(20) & 0xFF == ord("q"):
+            # if the key "q" is pressed on the keyboard, the program is terminated
+            # (1 ms only pumps the GUI events; it no longer caps the loop at ~50 FPS)
+            if cv2.waitKey(1) & 0xFF == ord("q"):
+                break
+        elif interrupted:
             break
 
+    grab_stop.set()
+    grab_thread.join()
     cap.release()
-    cv2.destroyAllWindows()
+    if show:
+        cv2.destroyAllWindows()
 
-    # Finalize focus-scoring session (best-effort, non-blocking)
+    # Finalize focus-scoring session (best-effort); it is sent after any queued
+    # edges, so the stop is the last thing the server sees
     try:
-        requests.post("http://127.0.0.1:3000/session/stop", json={}, timeout=0.5)
+        notifier.send("/session/stop", {}, timeout=0.5)
     except Exception:
         pass
+    notifier.close()
 
     return
 
@@ -3,7 +3,14 @@ Object Detection Module using YOLOv8
 Detects study-related objects: books, phones, laptops, etc.
 """
 
+import functools
+import math
+from collections import deque
+
+import cv2
 import numpy as np
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 
 try:
@@ -40,7 +47,30 @@ class ObjectDetector:
         'bottle': 39,
     }
     
-    def __init__(self, model_size: str = 'n', confidence_threshold: float = 0.35):
+    # Accelerated export formats and the file/directory name the exported
+    # model is cached under next to the .pt weights
+    EXPORT_SUFFIXES = {
+        'engine': '.engine',            # TensorRT (NVIDIA GPU), exported in FP16
+        'int8': '_int8.engine',         # TensorRT INT8, calibrated on int8_data
+        'onnx': '.onnx',                # ONNX Runtime
+        'openvino': '_openvino_model',  # OpenVINO (Intel CPU/iGPU)
+    }
+    
+    # Thumbnail (width, height) compared by the motion gate in detect_objects
+    MOTION_THUMB_SIZE = (80, 45)
+    
+    def __init__(
+        self,
+        model_size: str = 'n',
+        confidence_threshold: float = 0.35,
+        num_threads: Optional[int] = None,
+        weights: Optional[str] = None,
+        export_format: Optional[str] = None,
+        int8_data: Optional[str] = None,
+        imgsz: int = 640,
+        motion_threshold: Optional[float] = None,
+        max_skipped: int = 5
+    ):
         """
         Initialize object detector.
         
@@ -52,9 +82,58 @@ class ObjectDetector:
         confidence_threshold : float
             Minimum confidence score for detections (0.0 to 1.0)
             Lower threshold (0.35) helps detect phones in different orientations
+        num_threads : int, optional
+            Limit PyTorch's intra-op thread pool to this many threads, so YOLO
+            does not oversubscribe the CPU next to other native libraries.
+            None leaves PyTorch's default (one thread per logical CPU).
+        weights : str, optional
+            Path to custom .pt weights used instead of yolov8{model_size}.pt,
+            e.g. a model fine-tuned (and pruned) on just the study classes.
+            Class ids are looked up by name in the model, so such a model
+            may number its classes 0..6.
+        export_format : str, optional
+            Run inference on an exported copy of the model instead of PyTorch:
+            'engine' (TensorRT FP16), 'int8' (TensorRT INT8), 'onnx' or
+            'openvino'. The export happens once and is reused on later runs;
+            if INT8 fails the FP16 engine is tried, on any other failure the
+            PyTorch model is kept. None uses the .pt model directly.
+        int8_data : str, optional
+            Ultralytics dataset YAML whose images calibrate the INT8 export.
+            Frames of the actual desk scene work best; None falls back to
+            Ultralytics' default calibration set.
+        imgsz : int
+            Inference image size (exported models are built for this size)
+        motion_threshold : float, optional
+            If set, detect_objects skips inference and returns its previous
+            result while the mean absolute gray-level difference between a
+            thumbnail of the frame and that of the last inferred frame stays
+            below this (0-255 scale). None runs YOLO on every call.
+        max_skipped : int
+            With motion_threshold, an inference result stands in for at most
+            max_skipped + 1 camera frames (counting the frames a throttling
+            caller declares through detect_objects' frames argument) before
+            inference runs again regardless of motion. This keeps a reused
+            result younger than the temporal filter's history window.
         """
         self.confidence_threshold = confidence_threshold
+        self.imgsz = imgsz
+        self.int8_data = int8_data
+        # Worker thread (and CUDA stream, on GPU) behind submit(); created on first use
+        self._worker: Optional[ThreadPoolExecutor] = None
+        self._cuda_stream = None
+        # Reused downscale output buffers, one per position in a batch
+        self._resize_bufs: List[np.ndarray] = []
+        # Motion gate: thumbnail of the last inferred frame and its result
+        self.motion_threshold = motion_threshold
+        self.max_skipped = max_skipped
+        self._ref_thumb: Optional[np.ndarray] = None
+        self._last_result: Optional[Dict[str, bool]] = None
+        self._stale_frames = 0  # camera frames since the last inference
+        # Letterbox/normalize on the GPU instead of in Ultralytics' CPU path
+        self._gpu_preprocess = False
+        self._square_input = export_format in ('engine', 'int8')  # TensorRT engines have a fixed input shape
         self.model = None
+        self._predict = None  # model.predict with the fixed per-run arguments bound
         self.enabled = YOLO_AVAILABLE
         
         # Different thresholds for different objects
@@ -69,19 +148,159 @@ class ObjectDetector:
         }
         
         if YOLO_AVAILABLE:
+            if num_threads is not None:
+                try:
+                    import torch
+                    torch.set_num_threads(num_threads)
+                except Exception as e:
+                    print(f"Could not set PyTorch thread count: {e}")
+            
             try:
-                model_name = f'yolov8{model_size}.pt'
+                model_name = weights or f'yolov8{model_size}.pt'
                 self.model = YOLO(model_name)
                 print(f"YOLOv8 model loaded: {model_name}")
             except Exception as e:
                 print(f"Failed to load YOLO model: {e}")
                 self.enabled = False
+            
+            if self.model is not None and export_format:
+                self.model = self._load_exported(model_name, export_format)
+            
+            if self.model is not None:
+                try:
+                    import torch
+                    cuda = torch.cuda.is_available()
+                except Exception:
+                    cuda = False
+                
+                # Bind the arguments that never change between calls; on CUDA
+                # pin the device, run the PyTorch model in FP16 and let cuDNN
+                # pick the fastest kernels for the fixed input shape
+                predict_args = {'imgsz': self.imgsz, 'verbose': False}
+                if cuda:
+                    predict_args['device'] = 0
+                    if export_format is None:
+                        predict_args['half'] = True
+                    torch.backends.cudnn.benchmark = True
+                self._predict = functools.partial(self.model.predict, **predict_args)
+                self._gpu_preprocess = cuda and export_format in (None, 'engine', 'int8')
+        
+        self._build_class_table()
         
-        # Detection history for temporal filtering
-        self.detection_history: Dict[str, List[bool]] = {obj: [] for obj in self.STUDY_OBJECTS.keys()}
+        # Detection history for temporal filtering, with a running count of
+        # the detections in each window
         self.history_length = 8  # Reduced to 8 frames for faster response
+        self.detection_history: Dict[str, deque] = {
+            obj: deque(maxlen=self.history_length) for obj in self.STUDY_OBJECTS.keys()
+        }
+        self._hist_sum: Dict[str, int] = {obj: 0 for obj in self.STUDY_OBJECTS.keys()}
+        
+    def _build_class_table(self):
+        """
+        Map the model's class ids to study objects and their thresholds.
         
-    def detect_objects(self, frame: np.ndarray) -> Dict[str, bool]:
+        Ids are resolved by class name, so custom models with their own
+        numbering work; a model without the COCO names (or no model) uses
+        the COCO ids in STUDY_OBJECTS. The per-id threshold table used by
+        _extract_objects gives every other class +inf so it never passes.
+        """
+        names = getattr(self.model, 'names', None) or {}
+        by_name = {name: class_id for class_id, name in dict(names).items()}
+        study_ids = {obj: by_name[obj] for obj in self.STUDY_OBJECTS if obj in by_name}
+        if not study_ids:
+            study_ids = dict(self.STUDY_OBJECTS)
+        
+        self._id_to_name = {obj_id: obj_name for obj_name, obj_id in study_ids.items()}
+        self._id_to_thr = np.full(max(self._id_to_name) + 1, np.inf)
+        for obj_name, obj_id in study_ids.items():
+            self._id_to_thr[obj_id] = self.object_thresholds.get(obj_name, self.confidence_threshold)
+    
+    def _load_exported(self, model_name: str, export_format: str):
+        """Load the exported model, exporting it first if no cached copy exists."""
+        try:
+            suffix = self.EXPORT_SUFFIXES[export_format]
+            weights = Path(getattr(self.model, 'ckpt_path', None) or model_name)
+            exported = weights.with_name(weights.stem + suffix)
+            if not exported.exists():
+                print(f"Exporting {weights.name} to {export_format} (one-time, may take a few minutes)...")
+                export_args = {'format': export_format, 'imgsz': self.imgsz}
+                if export_format == 'engine':
+                    export_args.update(half=True, device=0)
+                elif export_format == 'int8':
+                    export_args.update(format='engine', int8=True, device=0)
+                    if self.int8_data:
+                        export_args['data'] = self.int8_data
+                # Ultralytics names every TensorRT export <stem>.engine; keep
+                # the INT8 one under its own name and leave any FP16 engine alone
+                fp16_engine = weights.with_name(weights.stem + '.engine')
+                backup = fp16_engine.with_name(fp16_engine.name + '.fp16')
+                if export_format == 'int8' and fp16_engine.exists():
+                    fp16_engine.replace(backup)
+                try:
+                    path = Path(self.model.export(**export_args))
+                    if path != exported:
+                        path.replace(exported)
+                finally:
+                    if backup.exists():
+                        backup.replace(fp16_engine)
+            model = YOLO(str(exported), task='detect')
+            print(f"YOLOv8 {export_format} model loaded: {exported}")
+            return model
+        except Exception as e:
+            if export_format == 'int8':
+                print(f"Could not use INT8 model, trying the FP16 engine: {e}")
+                return self._load_exported(model_name, 'engine')
+            print(f"Could not use {export_format} model, falling back to PyTorch: {e}")
+            return self.model
+    
+    def submit(self, frame: np.ndarray, frames: int = 1) -> Future:
+        """
+        Run detect_objects(frame, frames) on the detector's own worker thread.
+        
+        Inference then overlaps with the caller's work (both native backends
+        release the GIL). On CUDA the worker issues its kernels on a dedicated,
+        persistent stream instead of the default one. Submissions are
+        processed in order; the frame must not be modified until the future
+        is done.
+        
+        Parameters
+        ----------
+        frame : np.ndarray
+            Input frame (BGR format)
+        frames : int
+            Camera frames the result covers (see detect_objects)
+            
+        Returns
+        -------
+        Future
+            Resolves to the detect_objects result for the frame
+        """
+        if self._worker is None:
+            self._worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix='yolo')
+            try:
+                import torch
+                if torch.cuda.is_available():
+                    self._cuda_stream = torch.cuda.Stream()
+            except Exception:
+                self._cuda_stream = None
+        return self._worker.submit(self._detect_on_worker, frame, frames)
+    
+    def _detect_on_worker(self, frame: np.ndarray, frames: int) -> Dict[str, bool]:
+        if self._cuda_stream is None:
+            return self.detect_objects(frame, frames)
+        import torch
+        with torch.cuda.stream(self._cuda_stream):
+            detected = self.detect_objects(frame, frames)
+        self._cuda_stream.synchronize()
+        return detected
+    
+    def close(self):
+        """Stop the submit() worker thread (pending detections finish first)."""
+        if self._worker is not None:
+            self._worker.shutdown()
+            self._worker = None
+    
+    def detect_objects(self, frame: np.ndarray, frames: int = 1) -> Dict[str, bool]:
         """
         Detect study-related objects in frame.
         
@@ -89,57 +308,198 @@ class ObjectDetector:
         ----------
         frame : np.ndarray
             Input frame (BGR format)
+        frames : int
+            Camera frames the result is used for, i.e. the caller's own
+            throttle interval (1 when it calls on every frame). The motion
+            gate counts these, so throttling and gating together never reuse
+            one result for more than max_skipped + 1 frames.
             
         Returns
         -------
         Dict[str, bool]
             Dictionary mapping object names to presence (True/False)
         """
+        if self.motion_threshold is None or not self.enabled or self.model is None:
+            return self.detect_objects_batch([frame])[0]
+        
+        # Static scene: reuse the last result instead of running YOLO again.
+        # Compare against the last inferred frame (not the previous call) so
+        # slow drift still adds up to a re-run.
+        thumb = cv2.cvtColor(
+            cv2.resize(frame, self.MOTION_THUMB_SIZE, interpolation=cv2.INTER_AREA),
+            cv2.COLOR_BGR2GRAY
+        )
+        stale_frames = self._stale_frames + frames
+        if (
+            self._last_result is not None
+            and stale_frames + frames <= self.max_skipped + 1
+            and cv2.norm(thumb, self._ref_thumb, cv2.NORM_L1) / thumb.size < self.motion_threshold
+        ):
+            self._stale_frames = stale_frames
+            return dict(self._last_result)
+        
+        self._ref_thumb = thumb
+        self._stale_frames = 0
+        self._last_result = self.detect_objects_batch([frame])[0]
+        return dict(self._last_result)
+    
+    def detect_objects_batch(self, frames: List[np.ndarray]) -> List[Dict[str, bool]]:
+        """
+        Detect study-related objects in several frames with one model call.
+        
+        The frames are inferred as a single batch and then fed through the
+        temporal filter in order, so the result for each frame is the same
+        as calling detect_objects on them one after another.
+        
+        Parameters
+        ----------
+        frames : List[np.ndarray]
+            Input frames (BGR format), oldest first
+            
+        Returns
+        -------
+        List[Dict[str, bool]]
+            One dictionary per frame mapping object names to presence (True/False)
+        """
         if not self.enabled or self.model is None:
-            return {obj: False for obj in self.STUDY_OBJECTS.keys()}
+            return [{obj: False for obj in self.STUDY_OBJECTS.keys()} for _ in frames]
         
         try:
             # Run detection with lower confidence for better sensitivity
-            results = self.model(frame, verbose=False, conf=0.25)
-            
-            # Extract detected classes
-            detected_objects = {obj: False for obj in self.STUDY_OBJECTS.keys()}
-            
-            for result in results:
-                if result.boxes is not None:
-                    for box in result.boxes:
-                        class_id = int(box.cls[0])
-                        confidence = float(box.conf[0])
-                        
-                        # Check if this is a study-related object with custom threshold
-                        for obj_name, obj_id in self.STUDY_OBJECTS.items():
-                            threshold = self.object_thresholds.get(obj_name, self.confidence_threshold)
-                            if class_id == obj_id and confidence >= threshold:
-                                detected_objects[obj_name] = True
-            
-            # Update detection history for temporal filtering
-            for obj_name, detected in detected_objects.items():
-                self.detection_history[obj_name].append(detected)
-                if len(self.detection_history[obj_name]) > self.history_length:
-                    self.detection_history[obj_name].pop(0)
-            
-            # Apply temporal filtering (object must be detected in 2+ of last 8 frames)
-            # Reduced threshold for faster response
-            filtered_objects = {}
-            for obj_name in detected_objects.keys():
-                if len(self.detection_history[obj_name]) >= 2:
-                    detection_count = sum(self.detection_history[obj_name])
-                    # Phone needs only 2 detections, others need 3
-                    min_detections = 2 if obj_name == 'cell phone' else 3
-                    filtered_objects[obj_name] = detection_count >= min_detections
-                else:
-                    filtered_objects[obj_name] = detected_objects[obj_name]
-            
-            return filtered_objects
+            results = self._predict(self._prepare(frames), conf=0.25)
+            return [self._filter_detections(self._extract_objects(result)) for result in results]
             
         except Exception as e:
             print(f"Object detection error: {e}")
-            return {obj: False for obj in self.STUDY_OBJECTS.keys()}
+            return [{obj: False for obj in self.STUDY_OBJECTS.keys()} for _ in frames]
+    
+    def warmup(self, frame_shape: Optional[Tuple[int, ...]] = None):
+        """
+        Run one throwaway inference so the first real frame is not slow.
+        
+        The first call pays for predictor setup, TensorRT deserialization
+        and (with cudnn.benchmark) cuDNN kernel selection, often seconds.
+        The detection history is not touched.
+        
+        Parameters
+        ----------
+        frame_shape : tuple, optional
+            Shape of the camera frames, (height, width, 3), so the warm-up
+            hits the same input size; defaults to an imgsz x imgsz frame
+        """
+        if not self.enabled or self.model is None:
+            return
+        dummy = np.zeros(frame_shape or (self.imgsz, self.imgsz, 3), dtype=np.uint8)
+        try:
+            self._predict(self._prepare([dummy]), conf=0.25)
+        except Exception as e:
+            print(f"YOLO warm-up failed: {e}")
+    
+    def _prepare(self, frames: List[np.ndarray]):
+        """Model input for frames: a GPU-letterboxed tensor, or downscaled arrays."""
+        if self._gpu_preprocess:
+            try:
+                return self._preprocess_gpu(frames)
+            except Exception as e:
+                print(f"GPU preprocessing failed, using CPU path: {e}")
+                self._gpu_preprocess = False
+        return [self._downscale(frame, i) for i, frame in enumerate(frames)]
+    
+    def _downscale(self, frame: np.ndarray, slot: int) -> np.ndarray:
+        """
+        Shrink frame so its longer side is imgsz, keeping the aspect ratio.
+        
+        Ultralytics would do the same resize inside its letterbox; doing it
+        here into a reused buffer means only the small image is copied and
+        padded from then on. Frames already small enough are returned as-is.
+        """
+        h, w = frame.shape[:2]
+        scale = self.imgsz / max(h, w)
+        if scale >= 1.0:
+            return frame
+        size = (max(1, round(w * scale)), max(1, round(h * scale)))
+        shape = (size[1], size[0]) + frame.shape[2:]
+        while len(self._resize_bufs) <= slot:
+            self._resize_bufs.append(None)
+        buf = self._resize_bufs[slot]
+        if buf is None or buf.shape != shape or buf.dtype != frame.dtype:
+            buf = self._resize_bufs[slot] = np.empty(shape, dtype=frame.dtype)
+        cv2.resize(frame, size, dst=buf, interpolation=cv2.INTER_LINEAR)
+        return buf
+    
+    def _preprocess_gpu(self, frames: List[np.ndarray]):
+        """
+        Upload the raw BGR frames once and letterbox them on the GPU.
+        
+        Resize, BGR->RGB, HWC->CHW, /255 and padding run as torch ops on the
+        device, producing the normalized BCHW tensor Ultralytics feeds to the
+        network as-is (tensor sources skip its CPU preprocessing).
+        """
+        import torch
+        import torch.nn.functional as F
+        
+        batch = torch.from_numpy(np.stack(frames)).to('cuda', non_blocking=True)
+        batch = batch.permute(0, 3, 1, 2).flip(1).float().div_(255.0)
+        h, w = batch.shape[2:]
+        scale = min(self.imgsz / h, self.imgsz / w)
+        new_h, new_w = max(1, round(h * scale)), max(1, round(w * scale))
+        if (new_h, new_w) != (h, w):
+            batch = F.interpolate(batch, size=(new_h, new_w), mode='bilinear', align_corners=False)
+        
+        # Pad with Ultralytics' letterbox gray to a stride multiple (or the full square)
+        if self._square_input:
+            out_h = out_w = self.imgsz
+        else:
+            out_h, out_w = math.ceil(new_h / 32) * 32, math.ceil(new_w / 32) * 32
+        pad_h, pad_w = out_h - new_h, out_w - new_w
+        batch = F.pad(
+            batch,
+            (pad_w // 2, pad_w - pad_w // 2, pad_h // 2, pad_h - pad_h // 2),
+            value=114 / 255.0
+        )
+        return batch.contiguous()
+    
+    def _extract_objects(self, result) -> Dict[str, bool]:
+        """Study objects present in one frame's result, using the per-object thresholds."""
+        detected_objects = {obj: False for obj in self.STUDY_OBJECTS.keys()}
+        
+        if result.boxes is not None and len(result.boxes):
+            # One device->host copy per frame for all boxes
+            class_ids = result.boxes.cls.cpu().numpy().astype(np.int64)
+            confidences = result.boxes.conf.cpu().numpy()
+            
+            # Keep study objects that pass their custom threshold
+            known = class_ids < len(self._id_to_thr)
+            class_ids, confidences = class_ids[known], confidences[known]
+            passed = class_ids[confidences >= self._id_to_thr[class_ids]]
+            for class_id in np.unique(passed):
+                detected_objects[self._id_to_name[int(class_id)]] = True
+        
+        return detected_objects
+    
+    def _filter_detections(self, detected_objects: Dict[str, bool]) -> Dict[str, bool]:
+        """Push one frame's detections into the history and return the filtered presence."""
+        # Update detection history for temporal filtering
+        for obj_name, detected in detected_objects.items():
+            history = self.detection_history[obj_name]
+            if len(history) == history.maxlen:
+                self._hist_sum[obj_name] -= history[0]  # evicted by the append
+            history.append(int(detected))
+            self._hist_sum[obj_name] += int(detected)
+        
+        # Apply temporal filtering (object must be detected in 2+ of last 8 frames)
+        # Reduced threshold for faster response
+        filtered_objects = {}
+        for obj_name in detected_objects.keys():
+            if len(self.detection_history[obj_name]) >= 2:
+                detection_count = self._hist_sum[obj_name]
+                # Phone needs only 2 detections, others need 3
+                min_detections = 2 if obj_name == 'cell phone' else 3
+                filtered_objects[obj_name] = detection_count >= min_detections
+            else:
+                filtered_objects[obj_name] = detected_objects[obj_name]
+        
+        return filtered_objects
     
     def get_detection_details(self, frame: np.ndarray) -> List[Dict]:
         """
@@ -159,7 +519,7 @@ class ObjectDetector:
             return []
         
         try:
-            results = self.model(frame, verbose=False, conf=self.confidence_threshold)
+            results = self._predict(frame, conf=self.confidence_threshold)
             detections = []
             
             for result in results:
@@ -188,8 +548,8 @@ class ObjectDetector:
         if not self.detection_history:
             return False
         
-        book_present = sum(self.detection_history.get('book', [])) >= 3
-        laptop_present = sum(self.detection_history.get('laptop', [])) >= 3
+        book_present = self._hist_sum.get('book', 0) >= 3
+        laptop_present = self._hist_sum.get('laptop', 0) >= 3
         
         return book_present or laptop_present
     
@@ -198,4 +558,4 @@ class ObjectDetector:
         if not self.detection_history:
             return False
         
-        return sum(self.detection_history.get('cell phone', [])) >= 3
+        return self._hist_sum.get('cell phone', 0) >= 3
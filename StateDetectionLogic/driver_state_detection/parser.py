@@ -14,6 +14,23 @@ def get_args():
         help="Camera number, default is 0 (webcam)",
     )
 
+    parser.add_argument(
+        "--capture_size",
+        type=str,
+        default="640x480",
+        metavar="",
+        help="Requested capture resolution as WIDTHxHEIGHT, '0' keeps the camera default, default is 640x480",
+    )
+
+    parser.add_argument(
+        "--capture_backend",
+        type=str,
+        default="auto",
+        choices=["auto", "any", "v4l2", "gstreamer", "dshow", "msmf", "avfoundation"],
+        metavar="",
+        help="VideoCapture backend; 'auto' picks V4L2/DirectShow/AVFoundation by platform, default is auto",
+    )
+
     parser.add_argument(
         "--camera_params",
         type=str,
@@ -21,6 +38,12 @@ def get_args():
     )
 
     # visualisation parameters
+    parser.add_argument(
+        "--show",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help="Show the annotated video window; use --no-show to run headless (stop with Ctrl+C), default is true",
+    )
     parser.add_argument(
         "--show_fps",
         type=bool,
@@ -129,6 +152,52 @@ def get_args():
         help="Seconds the face must be missing before reporting 'face not detected' events (default 2.5)",
     )
 
+    parser.add_argument(
+        "--detect_stride",
+        type=int,
+        default=1,
+        metavar="",
+        help="Run the face mesh every N frames and reuse the last landmarks in between, default is 1 (every frame)",
+    )
+
+    # Object detection parameters
+    parser.add_argument(
+        "--yolo_format",
+        type=str,
+        default="pt",
+        choices=["pt", "engine", "int8", "onnx", "openvino"],
+        metavar="",
+        help="YOLO inference backend: pt (PyTorch), engine (TensorRT FP16), int8 (TensorRT INT8), onnx or openvino; exported once on first use, default is pt",
+    )
+    parser.add_argument(
+        "--yolo_weights",
+        type=str,
+        default=None,
+        metavar="",
+        help="Custom YOLO .pt weights (e.g. fine-tuned/pruned on the study classes) instead of yolov8n.pt",
+    )
+    parser.add_argument(
+        "--yolo_calib",
+        type=str,
+        default=None,
+        metavar="",
+        help="Dataset YAML with desk-scene images used to calibrate the int8 export, default is Ultralytics' built-in set",
+    )
+    parser.add_argument(
+        "--yolo_interval",
+        type=int,
+        default=5,
+        metavar="",
+        help="Run YOLO object detection every N frames and reuse the last result in between, default is 5",
+    )
+    parser.add_argument(
+        "--yolo_motion_thresh",
+        type=float,
+        default=3.0,
+        metavar="",
+        help="Skip a scheduled YOLO run (up to 5 in a row) while the mean gray-level change since the last run stays below this, 0 disables, default is 3.0",
+    )
+
     # parse the arguments and store them in the args variable dictionary
     args, _ = parser.parse_known_args()
 
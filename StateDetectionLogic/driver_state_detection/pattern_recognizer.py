@@ -5,7 +5,64 @@ Detects temporal patterns in user behavior to distinguish activities
 
 import numpy as np
 from typing import List, Optional, Tuple
-from collections import deque
+
+
+def _mean_std(x: np.ndarray) -> Tuple[float, float]:
+    """
+    Mean and (population) standard deviation of x.
+    
+    Same arithmetic as np.mean + np.std, but the mean is computed once
+    instead of twice (np.std recomputes it internally).
+    """
+    mean = x.mean()
+    dev = x - mean
+    return mean, np.sqrt((dev * dev).mean())
+
+
+class _SampleWindow:
+    """
+    Fixed-size sliding window of floats backed by a preallocated ndarray.
+    
+    Every sample is written twice, at head and head + size, so the newest
+    `size` samples are always one contiguous slice of the buffer and view()
+    never has to copy or roll.
+    """
+    
+    def __init__(self, size: int):
+        self.size = size
+        self._buf = np.zeros(2 * size, dtype=np.float64)
+        self._head = 0
+        self._len = 0
+    
+    def __len__(self) -> int:
+        return self._len
+    
+    def append(self, value: float):
+        """Add one sample, dropping the oldest once the window is full."""
+        self._buf[self._head] = value
+        self._buf[self._head + self.size] = value
+        self._head = (self._head + 1) % self.size
+        if self._len < self.size:
+            self._len += 1
+    
+    def extend(self, values: np.ndarray):
+        """Add a 1-D float array of samples in order."""
+        values = values[-self.size:]
+        n = len(values)
+        if n == 0:
+            return
+        idx = (self._head + np.arange(n)) % self.size
+        self._buf[idx] = values
+        self._buf[idx + self.size] = values
+        self._head = (self._head + n) % self.size
+        self._len = min(self._len + n, self.size)
+    
+    def view(self) -> np.ndarray:
+        """Samples in the window, oldest first (zero-copy, read-only)."""
+        end = self._head + self.size
+        window = self._buf[end - self._len:end]
+        window.flags.writeable = False
+        return window
 
 
 class PatternRecognizer:
@@ -26,9 +83,9 @@ class PatternRecognizer:
         self.window_size = window_size
         
         # Sliding windows for metrics
-        self.gaze_window = deque(maxlen=window_size)
-        self.pitch_window = deque(maxlen=window_size)
-        self.ear_window = deque(maxlen=window_size)
+        self.gaze_window = _SampleWindow(window_size)
+        self.pitch_window = _SampleWindow(window_size)
+        self.ear_window = _SampleWindow(window_size)
         
     def add_sample(
         self,
@@ -44,6 +101,31 @@ class PatternRecognizer:
         if ear is not None:
             self.ear_window.append(ear)
     
+    def add_samples_batch(
+        self,
+        gaze: np.ndarray,
+        pitch: np.ndarray,
+        ear: np.ndarray
+    ):
+        """
+        Add a batch of samples to the sliding windows in one call.
+        
+        Equivalent to calling add_sample for each index in order. Missing
+        values are given as NaN (the array counterpart of None) and skipped.
+        
+        Parameters
+        ----------
+        gaze, pitch, ear : np.ndarray
+            1-D arrays (or array-likes) of per-frame metrics
+        """
+        for window, values in (
+            (self.gaze_window, gaze),
+            (self.pitch_window, pitch),
+            (self.ear_window, ear),
+        ):
+            values = np.asarray(values, dtype=np.float64).ravel()
+            window.extend(values[~np.isnan(values)])
+    
     def detect_reading_pattern(self) -> bool:
         """
         Detect reading pattern: systematic horizontal eye movement.
@@ -56,7 +138,7 @@ class PatternRecognizer:
         if len(self.gaze_window) < 20:
             return False
         
-        gaze_array = np.array(list(self.gaze_window))
+        gaze_array = self.gaze_window.view()
         
         # Reading shows periodic gaze movement (left-right scanning)
         # Look for oscillation in gaze score
@@ -70,7 +152,7 @@ class PatternRecognizer:
             
             # Also check that head is relatively stable (not moving much)
             if len(self.pitch_window) >= 20:
-                pitch_stability = np.std(list(self.pitch_window)[-20:])
+                _, pitch_stability = _mean_std(self.pitch_window.view()[-20:])
                 is_reading = is_reading and pitch_stability < 5.0
             
             return is_reading
@@ -90,7 +172,7 @@ class PatternRecognizer:
             return False
         
         try:
-            recent_gaze = list(self.gaze_window)[-30:]
+            recent_gaze = self.gaze_window.view()[-30:]
             
             # Thinking: gaze increases (looking away) then decreases (returning)
             first_half = np.mean(recent_gaze[:15])
@@ -117,11 +199,10 @@ class PatternRecognizer:
             return False
         
         try:
-            recent_pitch = np.array(list(self.pitch_window)[-30:])
+            recent_pitch = self.pitch_window.view()[-30:]
             
             # Phone usage: steep angle (< -60°) sustained
-            mean_pitch = np.mean(recent_pitch)
-            pitch_stability = np.std(recent_pitch)
+            mean_pitch, pitch_stability = _mean_std(recent_pitch)
             
             # Steep angle + very stable (holding phone still)
             is_phone = mean_pitch < -60 and pitch_stability < 3.0
@@ -145,19 +226,23 @@ class PatternRecognizer:
             return True, 0  # Not enough data, assume natural
         
         try:
-            ear_array = np.array(list(self.ear_window))
+            ear_array = self.ear_window.view()
             
             # Detect blinks: EAR drops below threshold then recovers
             EAR_BLINK_THRESHOLD = 0.15
-            blinks = 0
-            in_blink = False
+            below = ear_array < EAR_BLINK_THRESHOLD
+            decided = below | (ear_array > EAR_BLINK_THRESHOLD)
             
-            for ear in ear_array:
-                if ear < EAR_BLINK_THRESHOLD and not in_blink:
-                    blinks += 1
-                    in_blink = True
-                elif ear > EAR_BLINK_THRESHOLD:
-                    in_blink = False
+            # A sample exactly at the threshold keeps the previous open/closed
+            # state: forward-fill the state from the last decided sample
+            # (the window starts with the eye open)
+            last_decided = np.maximum.accumulate(
+                np.where(decided, np.arange(len(ear_array)), 0)
+            )
+            in_blink = below[last_decided]
+            
+            # Each open -> closed transition is one blink
+            blinks = int(in_blink[0]) + int(np.count_nonzero(in_blink[1:] & ~in_blink[:-1]))
             
             # Natural blink rate: 15-20 per minute
             # In 60 frames (~2 seconds at 30fps), expect 0-2 blinks
@@ -185,7 +270,7 @@ class PatternRecognizer:
             return True  # Not enough data
         
         try:
-            pitch_array = np.array(list(self.pitch_window))
+            pitch_array = self.pitch_window.view()
             
             # Calculate variance in recent window
             variance = np.var(pitch_array)
@@ -207,41 +292,64 @@ class PatternRecognizer:
         float
             Engagement score (0.0 = disengaged, 1.0 = highly engaged)
         """
+        is_natural_blink, _ = self.detect_blink_pattern()
+        return self._engagement_score(
+            self.detect_reading_pattern(),
+            self.detect_thinking_pattern(),
+            self.detect_phone_pattern(),
+            is_natural_blink,
+            self.detect_micro_movements(),
+        )
+    
+    @staticmethod
+    def _engagement_score(
+        reading: bool,
+        thinking: bool,
+        phone: bool,
+        natural_blinks: bool,
+        micro_movements: bool
+    ) -> float:
+        """Engagement score from already-evaluated pattern flags."""
         score = 0.5  # Baseline
         
         # Boost for reading pattern
-        if self.detect_reading_pattern():
+        if reading:
             score += 0.3
         
         # Slight boost for thinking (active learning)
-        if self.detect_thinking_pattern():
+        if thinking:
             score += 0.1
         
         # Penalty for phone usage
-        if self.detect_phone_pattern():
+        if phone:
             score -= 0.5
         
         # Penalty for unnatural patterns
-        is_natural_blink, _ = self.detect_blink_pattern()
-        if not is_natural_blink:
+        if not natural_blinks:
             score -= 0.3
         
-        if not self.detect_micro_movements():
+        if not micro_movements:
             score -= 0.3
         
         # Clamp to [0, 1]
         return max(0.0, min(1.0, score))
     
     def get_pattern_summary(self) -> dict:
-        """Get summary of detected patterns."""
+        """Get summary of detected patterns (each detector runs once)."""
         is_natural_blink, blink_count = self.detect_blink_pattern()
-        
-        return {
+        summary = {
             'reading': self.detect_reading_pattern(),
             'thinking': self.detect_thinking_pattern(),
             'phone': self.detect_phone_pattern(),
             'natural_blinks': is_natural_blink,
             'blink_count': blink_count,
             'micro_movements': self.detect_micro_movements(),
-            'engagement_score': self.get_engagement_score(),
         }
+        summary['engagement_score'] = self._engagement_score(
+            summary['reading'],
+            summary['thinking'],
+            summary['phone'],
+            is_natural_blink,
+            summary['micro_movements'],
+        )
+        return summary
@@ -5,11 +5,12 @@ import time
 import atexit
 import logging
 import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from dotenv import load_dotenv
 from flask import Flask, jsonify, request
 from flask_sock import Sock
-from driver_state_detection.focus_score_calculator import SessionServerStore
+from driver_state_detection.focus_score_calculator import SessionServerStore, _get_client
 
 # Load environment variables from .env file
 env_path = Path(__file__).parent.parent / '.env'
@@ -24,10 +25,39 @@ app.logger.setLevel(logging.INFO)
 proc = None
 light_on_state = False
 ws_clients = set()  # track connected WebSocket clients
+ws_clients_lock = threading.Lock()  # /ws handlers mutate ws_clients from their own threads
+_broadcast_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="ws-broadcast")
+_broadcast_lock = threading.Lock()  # keeps broadcasts in order for every client
+STATS_CACHE_TTL_S = 0.5
+_stats_cache = {}  # session_id -> (expires_at monotonic, session document dict)
+_stats_gen = {}    # session_id -> invalidation count (a read spanning one is not cached); both dropped on stop
+_stats_cache_lock = threading.Lock()
 session_store = None  # type: SessionServerStore | None
 session_id = None     # type: str | None
 session_username = None  # type: str | None
 session_username_lock = threading.Lock()
+_store_singleton = None  # type: SessionServerStore | None
+_store_lock = threading.Lock()
+
+
+def _get_store():
+    """Process-wide SessionServerStore, created on first use and reused by every session."""
+    global _store_singleton
+    with _store_lock:
+        if _store_singleton is None:
+            _store_singleton = SessionServerStore()
+        return _store_singleton
+
+
+def _close_store():
+    """Flush the store's pending session creates at interpreter exit."""
+    with _store_lock:
+        store = _store_singleton
+    if store is not None:
+        store.close()
+
+
+atexit.register(_close_store)
 
 
 @app.before_request
@@ -45,6 +75,7 @@ def root():
             "/stop", 
             "/status", 
             "/light", 
+            "/state",
             "/ws",
             "/session/start",
             "/session/edge",
@@ -60,13 +91,32 @@ def status():
     pid = proc.pid if running else None
     return jsonify({"running": running, "pid": pid})
 
-@app.route('/light', methods=['POST'])
-def light():
+def _safe_send(ws, message):
+    """Send to one client, dropping it from ws_clients if the send fails."""
+    try:
+        ws.send(message)
+    except Exception:
+        with ws_clients_lock:
+            ws_clients.discard(ws)
+
+
+def _broadcast(message):
+    """Send message to all WebSocket clients in parallel and wait for every send."""
+    with ws_clients_lock:
+        clients = list(ws_clients)
+    with _broadcast_lock:
+        if len(clients) <= 1:
+            for ws in clients:
+                _safe_send(ws, message)
+        else:
+            list(_broadcast_pool.map(lambda ws: _safe_send(ws, message), clients))
+
+
+def _set_light(val):
+    """Update the light state from a loosely-typed JSON value and broadcast it."""
     global light_on_state
-    data = request.get_json(silent=True) or {}
 
     # Robust parsing of light_on
-    val = data.get("light_on", True)
     if isinstance(val, bool):
         light_on_state = val
     elif isinstance(val, str):
@@ -79,13 +129,15 @@ def light():
     # No database writes here; just broadcast state
 
     # Broadcast to all connected WebSocket clients as raw string
-    for ws in list(ws_clients):
-        try:
-            ws.send("ON" if light_on_state else "OFF")
-        except Exception:
-            ws_clients.discard(ws)
+    _broadcast("ON" if light_on_state else "OFF")
 
-    return jsonify({"status": "ok", "light_on": light_on_state})
+    return light_on_state
+
+
+@app.route('/light', methods=['POST'])
+def light():
+    data = request.get_json(silent=True) or {}
+    return jsonify({"status": "ok", "light_on": _set_light(data.get("light_on", True))})
 
 
 # -------------------- Focus scoring session APIs (do not affect /start|/stop) --------------------
@@ -102,7 +154,7 @@ def session_start():
     username = body.get("username")
     try:
         if session_store is None or session_id is None:
-            store = SessionServerStore()
+            store = _get_store()
             sid = store.start_session(user_id=user_id, username=username)
             session_store, session_id = store, sid
             session_username = username
@@ -121,35 +173,75 @@ def session_edge():
     JSON: {"distracted": bool, "activity": str (optional), "severity": float (optional)}
     Lazily creates a session if one doesn't exist.
     """
-    global session_store, session_id
     data = request.get_json(silent=True) or {}
+    return jsonify(_record_edge(data))
+
+
+def _invalidate_stats(sid):
+    """Drop the cached /session/stats document so the next poll sees a change."""
+    with _stats_cache_lock:
+        _stats_cache.pop(sid, None)
+        _stats_gen[sid] = _stats_gen.get(sid, 0) + 1
+
+
+def _forget_stats(sid):
+    """Drop all /session/stats state of a session once it has stopped."""
+    with _stats_cache_lock:
+        _stats_cache.pop(sid, None)
+        _stats_gen.pop(sid, None)
+
+
+def _record_edge(data):
+    """Apply a /session/edge payload; returns the response body."""
+    global session_store, session_id
     distracted = bool(data.get("distracted", False))
     activity = data.get("activity", "unknown")
     severity = data.get("severity", 0.5)
     
     try:
         if session_store is None or session_id is None:
-            store = SessionServerStore()
+            store = _get_store()
             sid = store.start_session(user_id=None, username=None)
             session_store, session_id = store, sid
             # Minimal log via @before_request already prints the endpoint
 
-        if distracted:
-            session_store.mark_distracted(session_id, activity=activity, severity=severity)
-        else:
-            session_store.mark_focused(session_id)
+        # Invalidate once the write has landed (or failed): clearing earlier
+        # would let a concurrent poll re-cache the pre-edge document
+        try:
+            if distracted:
+                session_store.mark_distracted(session_id, activity=activity, severity=severity)
+            else:
+                session_store.mark_focused(session_id)
+        finally:
+            _invalidate_stats(session_id)
         
         # Return activity and severity for app to display
-        return jsonify({
+        return {
             "status": "ok", 
             "sessionId": session_id,
             "distracted": distracted,
             "activity": activity,
             "severity": severity
-        })
+        }
     except Exception as e:
         app.logger.warning(f"/session/edge skipped: {e}")
-        return jsonify({"status": "skipped", "error": str(e)}), 200
+        return {"status": "skipped", "error": str(e)}
+
+
+@app.route('/state', methods=['POST'])
+def state():
+    """Apply a light change and, optionally, a focus edge in a single request.
+
+    JSON: {"light_on": bool, "distracted": bool (optional), "activity": str (optional),
+           "severity": float (optional)}
+    Same as POST /light followed by POST /session/edge (the latter only when
+    "distracted" is present), but one round-trip per state change.
+    """
+    data = request.get_json(silent=True) or {}
+    resp = {"status": "ok", "light_on": _set_light(data.get("light_on", True))}
+    if "distracted" in data:
+        resp["edge"] = _record_edge(data)
+    return jsonify(resp)
 
 
 @app.route('/session/stop', methods=['POST'])
@@ -173,6 +265,7 @@ def session_stop():
         app.logger.warning(f"/session/stop skipped: {e}")
         resp = {"status": "skipped", "error": str(e)}
     finally:
+        _forget_stats(session_id)
         session_store = None
         session_id = None
     return jsonify(resp)
@@ -185,18 +278,32 @@ def session_stats():
         if not session_store or not session_id:
             return jsonify({"status": "no_active_session"})
         
-        # Get stats from Firebase
         from datetime import datetime, timezone
-        from firebase_admin import firestore as admin_firestore
-        
-        db = admin_firestore.client()
-        session_ref = db.collection("sessionServer").document(session_id)
-        snap = session_ref.get()
-        
-        if not snap.exists:
-            return jsonify({"status": "session_not_found"})
         
-        data = snap.to_dict()
+        # Polling clients reuse the session document for STATS_CACHE_TTL_S;
+        # the elapsed time below is still computed fresh for every request
+        sid = session_id
+        now_mono = time.monotonic()
+        with _stats_cache_lock:
+            # Expired documents are dropped here rather than left behind
+            for key in [k for k, (expires_at, _) in _stats_cache.items() if expires_at <= now_mono]:
+                del _stats_cache[key]
+            cached = _stats_cache.get(sid)
+            gen = _stats_gen.get(sid, 0)
+        if cached is not None:
+            data = cached[1]
+        else:
+            # Get stats from Firebase (through the process-wide client)
+            session_ref = _get_client().collection("sessionServer").document(sid)
+            snap = session_ref.get()
+            
+            if not snap.exists:
+                return jsonify({"status": "session_not_found"})
+            
+            data = snap.to_dict()
+            with _stats_cache_lock:
+                if _stats_gen.get(sid, 0) == gen:
+                    _stats_cache[sid] = (now_mono + STATS_CACHE_TTL_S, data)
         started_at = data.get("startedAt")
         distracted_total_ms = data.get("distractedTotalMs", 0)
         interval_count = data.get("intervalCount", 0)
@@ -277,11 +384,7 @@ def start():
 
         # Fail-safe: ensure LED starts OFF
         light_on_state = False
-        for ws in list(ws_clients):
-            try:
-                ws.send("OFF")
-            except Exception:
-                ws_clients.discard(ws)
+        _broadcast("OFF")
 
         # No database session initialization here
 
@@ -311,6 +414,7 @@ def stop():
                 app.logger.error(f"Error stopping session: {e}")
                 resp.update({"sessionFinalizeError": str(e)})
             finally:
+                _forget_stats(session_id)
                 session_store = None
                 session_id = None
         return jsonify(resp)
@@ -325,11 +429,7 @@ def stop():
 
         # Ensure LED OFF after stopping
         light_on_state = False
-        for ws in list(ws_clients):
-            try:
-                ws.send("OFF")
-            except Exception:
-                ws_clients.discard(ws)
+        _broadcast("OFF")
 
     # Always finalize the current focus-scoring session after stopping the process
     if session_store and session_id:
@@ -341,6 +441,7 @@ def stop():
             app.logger.error(f"Error stopping session: {e}")
             resp = {"status": "stopped", "sessionFinalizeError": str(e)}
         finally:
+            _forget_stats(session_id)
             session_store = None
             session_id = None
         return jsonify(resp)
@@ -352,7 +453,8 @@ def stop():
 def websocket(ws):
     """Handle ESP32 WebSocket clients."""
     app.logger.info("ESP32 connected via WebSocket")
-    ws_clients.add(ws)
+    with ws_clients_lock:
+        ws_clients.add(ws)
     try:
         while True:
             msg = ws.receive()
@@ -360,7 +462,8 @@ def websocket(ws):
                 break
             app.logger.info(f"Received from ESP32: {msg}")
     finally:
-        ws_clients.discard(ws)
+        with ws_clients_lock:
+            ws_clients.discard(ws)
         app.logger.info("ESP32 disconnected")
 
 
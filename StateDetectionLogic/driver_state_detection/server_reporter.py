@@ -3,19 +3,127 @@ Optional server reporter - sends detection events to existing server
 Safe to use - fails silently if server unavailable
 """
 
-import requests
+import http.client
+import json
+import socket
+import threading
+from collections import deque
 import time
 from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+def _dumps(obj) -> bytes:
+    """Serialize a batch to JSON bytes, with orjson when it is installed."""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+    # default=float covers NumPy scalars leaking in from the ear/gaze metrics
+    return json.dumps(obj, separators=(",", ":"), default=float).encode()
+
+
+# Clock for event times and the token bucket: immune to wall-clock jumps
+_now = time.monotonic
+
+# Focus score (0-100) of each activity before the severity reduction
+ACTIVITY_SCORES = {
+    'focused_studying': 100,
+    'reading_book': 95,
+    'taking_notes': 90,
+    'typing': 85,
+    'drinking_water': 80,
+    'thinking': 70,
+    'looking_away': 40,
+    'phone_distraction': 10,
+    'face_missing': 0,
+    'unknown': 50
+}
 
 class ServerReporter:
     """Reports detection events to server without blocking"""
     
-    def __init__(self, server_url: str = "http://10.0.2.2:3000", enabled: bool = True):
+    # Adaptive token bucket for the batch POSTs (rates in requests/s): probe
+    # upwards while the server answers, back off when it struggles
+    MIN_RATE = 0.1         # never go below one POST per 10 s
+    MAX_RATE = 10.0
+    INCREASE_STEP = 0.1    # additive increase per successful POST
+    RECOVERY_GAIN = 0.5    # fraction of the gap to the last congestion rate recovered per success
+    DECREASE_FACTOR = 0.5  # multiplicative decrease on timeout / 5xx
+    BUCKET_SIZE = 2.0      # burst allowance in tokens
+    
+    # Circuit breaker: after this many consecutive failed POSTs (no response
+    # at all) stop touching the socket for BREAKER_BASE * 2**n seconds, n
+    # counting the failures beyond the threshold, at most BREAKER_CAP
+    BREAKER_THRESHOLD = 3
+    BREAKER_BASE = 1.0
+    BREAKER_CAP = 30.0
+    
+    CONNECT_TIMEOUT = 0.2  # seconds
+    READ_TIMEOUT = 0.8
+    
+    def __init__(
+        self,
+        server_url: str = "http://10.0.2.2:3000",
+        enabled: bool = True,
+        maxsize: int = 256,
+        flush_interval: float = 1.0,
+        max_batch: int = 64
+    ):
         self.server_url = server_url
+        parts = urlsplit(server_url)
+        self._conn_class = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        self._netloc = parts.netloc
+        self._path = f"{parts.path.rstrip('/')}/detection/events"
+        # A host that does not resolve disables reporting for good, so
+        # report_detection never pays for events nobody can receive
+        if enabled and not self._resolvable(server_url):
+            print(f"ServerReporter: cannot resolve {server_url}, reporting disabled")
+            enabled = False
         self.enabled = enabled
-        self.last_report_time = 0
-        self.report_interval = 2.0  # Report every 2 seconds
+        self.flush_interval = flush_interval  # POST at least this often while events arrive
+        self.max_batch = max_batch            # ...or as soon as this many are pending
+        
+        # Every event is kept and POSTed in batches (one JSON array per
+        # request) by a daemon worker, so the detection loop only appends.
+        # At most maxsize events wait; beyond that the oldest are dropped.
+        self._pending = deque(maxlen=maxsize)
+        self._cond = threading.Condition()
+        self._closed = False
+        # Consecutive identical states are merged into the pending event
+        # with this key (see report_detection)
+        self._last_key = None
+        
+        # Token bucket state (only touched by the worker)
+        self.rate = min(self.MAX_RATE, max(self.MIN_RATE, 1.0 / flush_interval))
+        self.cong_rate = self.rate  # rate at the last congestion signal
+        self.tokens = 1.0
+        self._last_refill = _now()
+        
+        # Circuit breaker state (only touched by the worker)
+        self._fail_count = 0
+        self._open_until = 0.0
         
+        self._thread = None
+        if enabled:
+            self._thread = threading.Thread(target=self._drain, daemon=True)
+            self._thread.start()
+        
+    @staticmethod
+    def _resolvable(url: str) -> bool:
+        """Whether the host of url resolves (a literal IP address always does)."""
+        try:
+            parts = urlsplit(url)
+            port = parts.port or (443 if parts.scheme == "https" else 80)
+            socket.getaddrinfo(parts.hostname, port, type=socket.SOCK_STREAM)
+        except (OSError, ValueError):  # ValueError: malformed port
+            return False
+        return True
+    
     def report_detection(
         self,
         activity: str,
@@ -27,22 +135,33 @@ class ServerReporter:
         head_pose: Optional[Dict] = None
     ):
         """
-        Send detection event to server (non-blocking, fails silently)
+        Queue a detection event for the next batch (non-blocking, fails silently)
+        
+        An event with the same activity, distraction flag, severity (to 0.01)
+        and objects as the one still pending is not queued again; that
+        event's 'count' and 'last_ts' are updated instead, so a batch only
+        carries state changes. Its ear/gaze/head_pose are the first sample's.
         """
         if not self.enabled:
             return
         
-        # Throttle reports
-        now = time.time()
-        if now - self.last_report_time < self.report_interval:
-            return
-        
         try:
+            now = _now()
+            key = (activity, is_distracted, round(severity, 2), frozenset(detected_objects.items()))
+            with self._cond:
+                if key == self._last_key and self._pending:
+                    run = self._pending[-1]
+                    run['count'] += 1
+                    run['last_ts'] = now
+                    return
+            
             # Calculate focus score from activity
             focus_score = self._calculate_focus_score(activity, severity)
             
             data = {
-                'timestamp': now,
+                'timestamp': now,  # monotonic; made wall-clock at flush
+                'last_ts': now,
+                'count': 1,
                 'activity': activity,
                 'distracted': is_distracted,
                 'severity': severity,
@@ -53,35 +172,135 @@ class ServerReporter:
                 'head_pose': head_pose or {}
             }
             
-            # Send to server (1 second timeout, don't block)
-            requests.post(
-                f"{self.server_url}/detection/event",
-                json=data,
-                timeout=1
-            )
-            
-            self.last_report_time = now
+            with self._cond:
+                self._pending.append(data)
+                self._last_key = key
+                if len(self._pending) >= self.max_batch:
+                    self._cond.notify()
             
         except Exception as e:
             # Fail silently - don't break detection if server down
             pass
     
-    def _calculate_focus_score(self, activity: str, severity: float) -> float:
+    def _drain(self):
+        """Worker: every flush_interval (or max_batch events) POST what is pending."""
+        # One persistent HTTP/1.1 connection for all batches, owned by this
+        # thread; closed after a failure and reopened by the next POST
+        conn = self._conn_class(self._netloc)
+        try:
+            while True:
+                with self._cond:
+                    self._cond.wait_for(
+                        lambda: self._closed or len(self._pending) >= self.max_batch,
+                        timeout=self.flush_interval
+                    )
+                    # Hold the batch until a token is available; events keep
+                    # accumulating in the meantime (the final flush is never held)
+                    while self._pending and not self._closed:
+                        now = _now()
+                        if now < self._open_until:
+                            # Breaker open: wait it out without any socket call
+                            self._cond.wait_for(lambda: self._closed, timeout=self._open_until - now)
+                            continue
+                        self._refill()
+                        if self.tokens >= 1.0:
+                            break
+                        self._cond.wait_for(lambda: self._closed, timeout=(1.0 - self.tokens) / self.rate)
+                    batch = list(self._pending)
+                    self._pending.clear()
+                    closed = self._closed
+                # With the breaker still open at close the server is
+                # considered down and the final batch is dropped
+                if batch and _now() >= self._open_until:
+                    # One wall-clock reading per batch turns the monotonic
+                    # event times into epoch seconds
+                    offset = time.time() - _now()
+                    for event in batch:
+                        event['timestamp'] += offset
+                        event['last_ts'] += offset
+                    self.tokens -= 1.0
+                    try:
+                        status = self._post(conn, _dumps(batch))
+                    except Exception:
+                        # Fail silently - don't break detection if server down
+                        conn.close()
+                        self._on_congestion()
+                        self._on_failure()
+                    else:
+                        # Any response proves the server is up: close the breaker
+                        self._fail_count = 0
+                        self._open_until = 0.0
+                        if status >= 500:
+                            self._on_congestion()
+                        elif status < 400:
+                            self._on_success()
+                if closed:
+                    break
+        finally:
+            conn.close()
+    
+    def _post(self, conn, body: bytes) -> int:
+        """POST body on conn and return the status (response body is discarded)."""
+        reused = conn.sock is not None
+        if not reused:
+            self._connect(conn)
+        try:
+            conn.request("POST", self._path, body=body, headers={"Content-Type": "application/json"})
+            response = conn.getresponse()
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            if not reused:
+                raise
+            # The server dropped the idle keep-alive connection: a fresh one
+            # gets one more try
+            conn.close()
+            self._connect(conn)
+            conn.request("POST", self._path, body=body, headers={"Content-Type": "application/json"})
+            response = conn.getresponse()
+        response.read()  # required before the connection carries another request
+        return response.status
+    
+    def _connect(self, conn):
+        """Open conn with the connect timeout, then switch the socket to the read timeout."""
+        conn.timeout = self.CONNECT_TIMEOUT
+        conn.connect()
+        conn.sock.settimeout(self.READ_TIMEOUT)
+    
+    def _refill(self):
+        now = _now()
+        self.tokens = min(self.BUCKET_SIZE, self.tokens + self.rate * (now - self._last_refill))
+        self._last_refill = now
+    
+    def _on_success(self):
+        """Additive increase, recovering quickly towards the last congestion rate."""
+        recovery = self.RECOVERY_GAIN * max(0.0, self.cong_rate - self.rate)
+        self.rate = min(self.MAX_RATE, self.rate + self.INCREASE_STEP + recovery)
+    
+    def _on_failure(self):
+        """Count a POST that got no response; open the breaker past the threshold."""
+        self._fail_count += 1
+        excess = self._fail_count - self.BREAKER_THRESHOLD
+        if excess >= 0:
+            self._open_until = _now() + min(self.BREAKER_CAP, self.BREAKER_BASE * 2 ** excess)
+    
+    def _on_congestion(self):
+        """Multiplicative decrease and an empty bucket after a timeout or 5xx."""
+        self.cong_rate = self.rate
+        self.rate = max(self.MIN_RATE, self.rate * self.DECREASE_FACTOR)
+        self.tokens = 0.0
+    
+    def close(self, timeout: Optional[float] = 2.0):
+        """Send the events still pending, then stop the worker."""
+        if self._thread is None:
+            return
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout)
+        self._thread = None
+    
+    @staticmethod
+    def _calculate_focus_score(activity: str, severity: float) -> float:
         """Convert activity to focus score (0-100)"""
-        
-        ACTIVITY_SCORES = {
-            'focused_studying': 100,
-            'reading_book': 95,
-            'taking_notes': 90,
-            'typing': 85,
-            'drinking_water': 80,
-            'thinking': 70,
-            'looking_away': 40,
-            'phone_distraction': 10,
-            'face_missing': 0,
-            'unknown': 50
-        }
-        
         base_score = ACTIVITY_SCORES.get(activity, 50)
         
         # Reduce by severity
@@ -1,8 +1,25 @@
 import json
+import queue
+import sys
 
 import cv2
 import numpy as np
 
+# VideoCapture backends selectable with --capture_backend
+CAPTURE_BACKENDS = {
+    "any": cv2.CAP_ANY,
+    "v4l2": cv2.CAP_V4L2,
+    "gstreamer": cv2.CAP_GSTREAMER,
+    "dshow": cv2.CAP_DSHOW,
+    "msmf": cv2.CAP_MSMF,
+    "avfoundation": cv2.CAP_AVFOUNDATION,
+}
+
+# FaceMesh gets a copy of the frame at most this wide. Calibration and the
+# runtime must share it: landmarks are normalized, but their precision (and so
+# the calibrated EAR/gaze baselines) depends on the model's input size
+MESH_MAX_WIDTH = 480
+
 
 def load_camera_parameters(file_path):
     try:
@@ -20,6 +37,76 @@ def load_camera_parameters(file_path):
         return None, None
 
 
+def put_latest(q, item):
+    """
+    Put item in a 1-slot queue, dropping the stale entry (single producer)
+    :param q: queue.Queue with maxsize=1
+    :param item: object
+        new entry; replaces the one the consumer has not taken yet, if any
+    :return:
+    None
+    """
+    try:
+        q.get_nowait()
+    except queue.Empty:
+        pass
+    q.put_nowait(item)
+
+
+def open_capture(camera, backend="auto"):
+    """
+    Open a camera with an explicit VideoCapture backend
+    :param camera: int
+        camera index
+    :param backend: str
+        one of CAPTURE_BACKENDS, or "auto" for the native backend of the platform
+        (V4L2 on Linux, DirectShow on Windows, AVFoundation on macOS)
+    :return:
+    cap: cv2.VideoCapture; falls back to the default backend if the requested one can't open the camera
+    """
+    if backend == "auto":
+        if sys.platform.startswith("linux"):
+            backend = "v4l2"
+        elif sys.platform == "win32":
+            backend = "dshow"
+        elif sys.platform == "darwin":
+            backend = "avfoundation"
+        else:
+            backend = "any"
+    api = CAPTURE_BACKENDS.get(backend, cv2.CAP_ANY)
+    cap = cv2.VideoCapture(camera, api)
+    if api != cv2.CAP_ANY and not cap.isOpened():
+        print(f"Capture backend '{backend}' unavailable, using the default one")
+        cap.release()
+        cap = cv2.VideoCapture(camera)
+    return cap
+
+
+def configure_capture(cap, capture_size="640x480"):
+    """
+    Request a capture resolution, MJPG encoding at 30 FPS and a one-frame driver buffer,
+    so every cap.read() returns the freshest, smallest frame the camera offers
+    :param cap: opened cv2.VideoCapture
+    :param capture_size: str
+        requested "WIDTHxHEIGHT"; an empty string or "0" keeps the driver default resolution
+    :return:
+    None (properties the backend does not support are silently ignored)
+    """
+    # MJPG avoids the YUYV -> BGR conversion on many UVC webcams and has to be
+    # set before the resolution on V4L2
+    cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*"MJPG"))
+    if capture_size and capture_size != "0":
+        try:
+            width, height = (int(v) for v in capture_size.lower().split("x"))
+        except ValueError:
+            print(f"Invalid capture size '{capture_size}', expected WIDTHxHEIGHT")
+        else:
+            cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+            cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+    cap.set(cv2.CAP_PROP_FPS, 30)
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
+
 def resize(frame, scale_percent):
     """
     Resize the image maintaining the aspect ratio
@@ -37,12 +124,32 @@ def resize(frame, scale_percent):
     return resized
 
 
+def limit_width(frame, max_width):
+    """
+    Downscale the image so its width is at most max_width, maintaining the aspect ratio
+    :param frame: opencv image/frame
+    :param max_width: int
+        maximum width in pixels of the returned image
+    :return:
+    limited: the frame itself if it's already narrow enough, otherwise a downscaled copy
+    """
+    height, width = frame.shape[:2]
+    if width <= max_width:
+        return frame
+    dim = (max_width, round(height * max_width / width))
+    return cv2.resize(frame, dim, interpolation=cv2.INTER_AREA)
+
+
 def get_landmarks(lms):
     surface = 0
     for lms0 in lms:
-        landmarks = [np.array([point.x, point.y, point.z]) for point in lms0.landmark]
-
-        landmarks = np.array(landmarks)
+        # One C-level copy into a float array instead of a small ndarray per point
+        points = lms0.landmark
+        landmarks = np.fromiter(
+            (c for point in points for c in (point.x, point.y, point.z)),
+            dtype=np.float64,
+            count=3 * len(points),
+        ).reshape(-1, 3)
 
         landmarks[landmarks[:, 0] < 0.0, 0] = 0.0
         landmarks[landmarks[:, 0] > 1.0, 0] = 1.0
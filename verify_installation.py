@@ -5,6 +5,8 @@ Verification script to check all enhancements are properly installed and working
 
 import sys
 import os
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 # Color codes for terminal output
@@ -25,6 +27,14 @@ def print_status(message, status):
     else:
         print(f"{BLUE}ℹ️  {message}{RESET}")
 
+def list_dir(dirpath):
+    """Names of the entries in a directory (one scandir instead of a stat per file); empty if it is missing"""
+    try:
+        with os.scandir(dirpath) as entries:
+            return {entry.name for entry in entries}
+    except (FileNotFoundError, NotADirectoryError):
+        return set()
+
 def check_file_exists(filepath, description):
     """Check if a file exists"""
     if Path(filepath).exists():
@@ -34,15 +44,33 @@ def check_file_exists(filepath, description):
         print_status(f"{description} MISSING: {filepath}", "FAIL")
         return False
 
-def check_module_import(module_name, description):
-    """Check if a Python module can be imported"""
+def check_files_in_dir(dirpath, files):
+    """Check a {filename: description} dict against one listing of dirpath; True if none is missing"""
+    missing = files.keys() - list_dir(dirpath)
+    for filename, desc in files.items():
+        filepath = dirpath / filename
+        if filename in missing:
+            print_status(f"{desc} MISSING: {filepath}", "FAIL")
+        else:
+            print_status(f"{desc}: {filepath}", "OK")
+    return not missing
+
+def is_module_available(module_name):
+    """Whether a module is installed, found via the import system's finders without importing it"""
     try:
-        __import__(module_name)
+        return importlib.util.find_spec(module_name) is not None
+    except (ImportError, ValueError):
+        return False
+
+def check_module_import(module_name, description, available=None):
+    """Check if a Python module is installed (available: result of an earlier is_module_available)"""
+    if available is None:
+        available = is_module_available(module_name)
+    if available:
         print_status(f"{description} installed", "OK")
-        return True
-    except ImportError:
+    else:
         print_status(f"{description} NOT installed", "FAIL")
-        return False
+    return available
 
 def main():
     print(f"\n{BLUE}{'='*60}")
@@ -64,27 +92,35 @@ def main():
         all_ok = False
     print()
     
-    # Check core dependencies
-    print(f"{BLUE}[2/6] Checking Core Dependencies{RESET}")
     deps = {
         'numpy': 'NumPy',
         'cv2': 'OpenCV',
         'mediapipe': 'MediaPipe',
     }
+    optional_deps = {
+        'ultralytics': 'YOLOv8 (Object Detection)',
+        'flask': 'Flask (Server)',
+        'firebase_admin': 'Firebase Admin',
+    }
+    
+    # Locate all dependencies concurrently (only the finders run, nothing is
+    # imported; the real imports happen in "Testing Module Imports" below),
+    # then report them in order
+    all_modules = list(deps) + list(optional_deps)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        available = dict(zip(all_modules, executor.map(is_module_available, all_modules)))
+    
+    # Check core dependencies
+    print(f"{BLUE}[2/6] Checking Core Dependencies{RESET}")
     for module, name in deps.items():
-        if not check_module_import(module, name):
+        if not check_module_import(module, name, available[module]):
             all_ok = False
     print()
     
     # Check optional dependencies
     print(f"{BLUE}[3/6] Checking Optional Dependencies{RESET}")
-    optional_deps = {
-        'ultralytics': 'YOLOv8 (Object Detection)',
-        'flask': 'Flask (Server)',
-        'firebase_admin': 'Firebase Admin',
-    }
     for module, name in optional_deps.items():
-        if not check_module_import(module, name):
+        if not check_module_import(module, name, available[module]):
             print_status(f"{name} not installed (optional)", "WARN")
     print()
     
@@ -97,10 +133,8 @@ def main():
         'pattern_recognizer.py': 'Pattern Recognizer',
         'enhanced_main.py': 'Enhanced Main Script',
     }
-    for filename, desc in modules.items():
-        filepath = detection_path / filename
-        if not check_file_exists(filepath, desc):
-            all_ok = False
+    if not check_files_in_dir(detection_path, modules):
+        all_ok = False
     print()
     
     # Check calibration tool
@@ -117,14 +151,13 @@ def main():
         'AppUsageMonitor.java': 'App Usage Monitor',
         'UsageStatsHelper.java': 'Usage Stats Helper',
     }
-    for filename, desc in android_files.items():
-        filepath = android_base / filename
-        if not check_file_exists(filepath, desc):
-            all_ok = False
+    if not check_files_in_dir(android_base, android_files):
+        all_ok = False
     print()
     
     # Test module imports
     print(f"{BLUE}Testing Module Imports{RESET}")
+    sys.stdout.flush()  # show the file checks before the (slow) imports run
     sys.path.insert(0, str(detection_path))
     
     try:
@@ -175,4 +208,9 @@ def main():
     return 0 if all_ok else 1
 
 if __name__ == "__main__":
+    # A terminal's stdout is line buffered (one write() per status line);
+    # block buffer it instead, main() flushes before the imports and the
+    # rest goes out at exit
+    if hasattr(sys.stdout, "reconfigure"):
+        sys.stdout.reconfigure(line_buffering=False)
     sys.exit(main())